@@ -6,5 +6,12 @@ admin.site.register(Product)
 admin.site.register(Category)
 admin.site.register(Order)
 admin.site.register(OrderItem)
+admin.site.register(Reservation)
+admin.site.register(DailySales)
+admin.site.register(DailyProductSales)
+admin.site.register(DailyCategorySales)
+admin.site.register(RelatedProduct)
+admin.site.register(RecommendationRefresh)
 admin.site.register(Review)
-admin.site.register(Wishlist)
\ No newline at end of file
+admin.site.register(Wishlist)
+admin.site.register(OutboxEmail)
\ No newline at end of file
@@ -0,0 +1,50 @@
+import json
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, HttpResponse
+from .models import Order, Product, Wishlist
+from .cart import aget_cart_summary, parse_operations, update_line, CartError
+from .catalog import get_filters
+from .conditional import listing_condition
+from . import listing_cache
+from .views import shared_page, update_guest_cart, listing_builder
+
+# Native async versions of the hot AJAX endpoints, routed in store/urls.py when ASYNC_VIEWS is on (zenstore/asgi.py).
+# Same URLs, payloads and responses as their counterparts in views.py; under WSGI those sync views are used instead,
+# since Django would otherwise run each of these through a fresh event loop per request.
+
+async def update_item(request):
+    try: data = json.loads(request.body); productId = data['productId']; action = data['action']; quantity = int(data.get('quantity', 1))
+    except: return JsonResponse({'status': 'error', 'message': 'Invalid data'}, status=400)
+    customer = await request.auser()
+    if customer.is_authenticated:
+        try: product = await Product.objects.aget(id=productId)
+        except: return JsonResponse({'status': 'error', 'message': 'Product not found'}, status=404)
+        order, created = await Order.objects.aget_or_create(user=customer, complete=False)
+        # Check, write and hold in one transaction, which can't span awaits
+        try: await sync_to_async(update_line)(order, product, action, quantity)
+        except CartError as e: return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        return JsonResponse({'status': 'success', 'cartTotal': (await aget_cart_summary(customer))['items']}, safe=False)
+    try: ops = parse_operations([{'productId': productId, 'action': action, 'quantity': quantity if action == 'add' else 1}])
+    except CartError as e: return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return await sync_to_async(update_guest_cart)(request, ops)
+
+@login_required(login_url='login')
+async def toggle_wishlist(request):
+    data = json.loads(request.body); user = await request.auser(); product = await Product.objects.aget(id=data['productId'])
+    item, created = await Wishlist.objects.aget_or_create(user=user, product=product)
+    if not created: await item.adelete(); status='removed'
+    else: status='added'
+    return JsonResponse({'status': status})
+
+async def initiate_payment(request):
+    # Just returns success to open the modal
+    return JsonResponse({'status': 'ready'})
+
+@shared_page
+@listing_condition
+async def products_partial(request):
+    # With ?cursor= only the next page of cards is returned (infinite scroll); a cache hit never leaves the event loop
+    cursor = request.GET.get('cursor'); filters = get_filters(request.GET)
+    template = 'store/product_cards.html' if cursor else 'store/product_list_partial.html'
+    return HttpResponse(await listing_cache.acached(template, {**filters, 'cursor': cursor}, listing_builder(filters, cursor, template)))
@@ -0,0 +1,127 @@
+import asyncio
+import inspect
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.test.utils import CaptureQueriesContext
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values: return 0.0
+    return values[min(len(values) - 1, max(0, int(round(p / 100 * len(values))) - 1))]
+
+
+def is_error(response):
+    if response.status_code >= 400: return True
+    if response.get('Content-Type', '').startswith('application/json'):
+        try: return json.loads(response.content).get('status') == 'error'
+        except (ValueError, AttributeError): return True
+    return False
+
+
+def summarize(latencies, queries, errors, wall):
+    latencies = sorted(latencies); n = len(latencies)
+    return {
+        'requests': n, 'errors': errors, 'wall_s': round(wall, 3), 'rps': round(n / wall, 1) if wall else 0.0,
+        'mean_ms': round(sum(latencies) / n, 2) if n else 0.0,
+        **{f'p{p}_ms': round(percentile(latencies, p), 2) for p in (50, 95, 99)},
+        'max_ms': round(latencies[-1], 2) if n else 0.0,
+        'queries_per_request': round(sum(queries) / n, 2) if n else 0.0,
+    }
+
+
+def run_scenario(request, total, concurrency=1, setup=None, prepare=None):
+    """
+    Fire `total` calls of `request(state, i)` spread over `concurrency` threads and summarize them.
+    `setup(worker)` builds each thread's state (e.g. a logged-in Client); `prepare(state, i)` runs
+    untimed before each request. Only the request itself is timed and has its queries counted.
+    """
+    latencies, queries, errors, started = [], [], [0], [None]
+    lock = threading.Lock()
+
+    def worker(index, count, threaded):
+        try:
+            state = setup(index) if setup else None
+            if threaded: barrier.wait()
+            else: started[0] = time.perf_counter()
+            for i in range(count):
+                if prepare: prepare(state, i)
+                with CaptureQueriesContext(connection) as captured:
+                    start = time.perf_counter(); response = request(state, i); elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies.append(elapsed); queries.append(len(captured)); errors[0] += is_error(response)
+        finally:
+            if threaded: connection.close()
+
+    shares = [total // concurrency + (w < total % concurrency) for w in range(concurrency)]
+    if concurrency <= 1: worker(0, total, False)  # inline, so it sees the caller's transaction
+    else:
+        barrier = threading.Barrier(concurrency, action=lambda: started.__setitem__(0, time.perf_counter()))
+        threads = [threading.Thread(target=worker, args=(w, shares[w], True)) for w in range(concurrency)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+    return summarize(latencies, queries, errors[0], time.perf_counter() - started[0])
+
+
+def header_queries(response):
+    # Query count from the Server-Timing header (SERVER_TIMING_HEADER on): ASGI requests run their SQL on
+    # per-request threads, out of CaptureQueriesContext's reach
+    match = re.search(r'(\d+) queries', response.get('Server-Timing', ''))
+    return int(match.group(1)) if match else 0
+
+
+def run_async_scenario(request, total, concurrency=1, setup=None, prepare=None):
+    """
+    run_scenario() for the ASGI stack: `concurrency` tasks on one event loop instead of threads. `request` and
+    `prepare` may return awaitables (AsyncClient calls). Like Django's ASGIHandler, each request gets its own
+    ThreadSensitiveContext, so its sync parts (and DB connection) run on a thread of their own.
+    """
+    latencies, queries, errors = [], [], [0]
+    states = [setup(w) if setup else None for w in range(concurrency)]  # untimed, before the loop starts
+
+    async def call(fn, state, i):
+        result = fn(state, i)
+        return await result if inspect.isawaitable(result) else result
+
+    async def worker(state, count):
+        for i in range(count):
+            async with ThreadSensitiveContext():
+                if prepare: await call(prepare, state, i)
+                start = time.perf_counter(); response = await call(request, state, i); elapsed = (time.perf_counter() - start) * 1000
+                await sync_to_async(close_old_connections)()  # request_finished, as the ASGI handler would
+            latencies.append(elapsed); queries.append(header_queries(response)); errors[0] += is_error(response)
+
+    async def main():
+        shares = [total // concurrency + (w < total % concurrency) for w in range(concurrency)]
+        await asyncio.gather(*(worker(states[w], shares[w]) for w in range(concurrency)))
+
+    started = time.perf_counter(); asyncio.run(main())
+    return summarize(latencies, queries, errors[0], time.perf_counter() - started)
+
+
+def run_isolated(workdir, label, env, args):
+    """
+    Run `bench_views <args>` in a subprocess with extra `env`, against its own snapshot of the SQLite database
+    (so writes and journal modes don't leak between runs). Returns its results dict.
+    """
+    db_path = os.path.join(workdir, f'{label}.sqlite3'); out = os.path.join(workdir, f'{label}.json')
+    src = sqlite3.connect(settings.DATABASES['default']['NAME']); dst = sqlite3.connect(db_path)
+    src.backup(dst); src.close(); dst.close()  # consistent snapshot of the current database
+    subprocess.run([sys.executable, sys.argv[0], 'bench_views', *args, '--json', out], env={**os.environ, **env, 'SQLITE_PATH': db_path},
+                   check=True, stdout=subprocess.DEVNULL)
+    with open(out) as f: return json.load(f)['results']
+
+
+def compare(current, baseline, keys=('rps', 'p50_ms', 'p95_ms', 'queries_per_request')):
+    """Per-scenario deltas between two `results` dicts, for scenarios present in both runs."""
+    return {name: {k: round(stats[k] - baseline[name][k], 2) for k in keys}
+            for name, stats in current.items() if name in baseline}
@@ -0,0 +1,192 @@
+import json
+from decimal import Decimal
+from django.core import signing
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from .models import Order, OrderItem, Product
+from .inventory import reserve, with_holds
+
+CART_CACHE_TIMEOUT = 60 * 60 * 24
+
+def cart_cache_key(user_id): return f'cart:{user_id}'
+
+def get_cart_summary(user):
+    """
+    Item count of the user's open order (the cart badge); one aggregate query on a cache miss, none after.
+    No money amounts: only OrderItem/Order writes invalidate the entry, so a repricing would leave them stale.
+    """
+    key = cart_cache_key(user.pk)
+    summary = cache.get(key)
+    if summary is None:
+        totals = OrderItem.objects.filter(order__user=user, order__complete=False).aggregate(items=Sum('quantity'))
+        summary = {'items': totals['items'] or 0}
+        cache.set(key, summary, CART_CACHE_TIMEOUT)
+    return summary
+
+async def aget_cart_summary(user):
+    """get_cart_summary() for async views: the same cache entry, read and filled without leaving the event loop."""
+    key = cart_cache_key(user.pk)
+    summary = await cache.aget(key)
+    if summary is None:
+        totals = await OrderItem.objects.filter(order__user=user, order__complete=False).aaggregate(items=Sum('quantity'))
+        summary = {'items': totals['items'] or 0}
+        await cache.aset(key, summary, CART_CACHE_TIMEOUT)
+    return summary
+
+def invalidate_cart(user_id):
+    if user_id: cache.delete(cart_cache_key(user_id))
+
+# --- BATCH MUTATIONS ---
+CART_ACTIONS = ('add', 'remove', 'set', 'delete')
+
+class CartError(Exception):
+    pass
+
+def parse_operations(payload):
+    """Validate a list of {productId, action, quantity} dicts into (product_id, action, quantity) tuples."""
+    if not isinstance(payload, list) or not payload: raise CartError("Expected a non-empty list of operations")
+    ops = []
+    for op in payload:
+        try: product_id = int(op['productId']); action = op['action']; quantity = int(op.get('quantity', 1))
+        except (KeyError, TypeError, ValueError): raise CartError("Invalid operation")
+        if action not in CART_ACTIONS or quantity < 0: raise CartError(f"Invalid operation for product {product_id}")
+        ops.append((product_id, action, quantity))
+    return ops
+
+def apply_to_quantities(quantities, products, ops):
+    """Replay ops over {product_id: qty}; any line that grows past its product's available stock raises CartError."""
+    result = dict(quantities)
+    for pid, action, quantity in ops:
+        result.setdefault(pid, 0)
+        if action == 'add': result[pid] += quantity
+        elif action == 'remove': result[pid] = max(0, result[pid] - quantity)
+        elif action == 'set': result[pid] = quantity
+        else: result[pid] = 0
+    short = [products[pid].name for pid, qty in result.items() if qty > quantities.get(pid, 0) and qty > products[pid].available_stock]
+    if short: raise CartError(f"Not enough stock for: {', '.join(sorted(short))}")
+    return result
+
+def apply_cart_operations(user, ops):
+    """
+    Apply every operation to the user's open order in one transaction: one query for the products,
+    one for the existing lines, then bulk create/update/delete. All-or-nothing: any unknown product
+    or stock shortfall raises CartError before anything is written. Returns the new cart.
+    """
+    product_ids = {pid for pid, _, _ in ops}
+    with transaction.atomic():
+        order, created = Order.objects.get_or_create(user=user, complete=False)
+        # Row locks (where supported) keep two carts from taking the same last units between check and hold
+        products = with_holds(Product.objects.select_for_update(of=('self',)), exclude_order=order).in_bulk(product_ids)
+        missing = product_ids - set(products)
+        if missing: raise CartError(f"Product not found: {', '.join(map(str, sorted(missing)))}")
+        lines = {}
+        for item in order.orderitem_set.filter(product_id__in=product_ids): lines.setdefault(item.product_id, item)
+        original = {pid: lines[pid].quantity if pid in lines else 0 for pid in product_ids}
+        quantities = apply_to_quantities(original, products, ops)
+
+        create, update, delete = [], [], []
+        for pid, qty in quantities.items():
+            if qty == original[pid]: continue
+            if qty <= 0: delete.append(lines[pid].pk)
+            elif pid in lines: lines[pid].quantity = qty; update.append(lines[pid])
+            else: create.append(OrderItem(order=order, product=products[pid], quantity=qty))
+        OrderItem.objects.bulk_create(create)
+        OrderItem.objects.bulk_update(update, ['quantity'])
+        OrderItem.objects.filter(pk__in=delete).delete()
+        reserve(order, quantities, {pid: p.available_stock for pid, p in products.items()}, original)
+        transaction.on_commit(lambda: invalidate_cart(user.pk))  # bulk writes skip the OrderItem signals
+    return cart_lines(order)
+
+def update_line(order, product, action, quantity=1):
+    """updateItem's single line change ('add' n or 'remove' one), checked against available stock and held, atomically."""
+    with transaction.atomic():
+        # Locked like apply_cart_operations, so two carts can't both pass the check for the same last units
+        locked = with_holds(Product.objects.select_for_update(of=('self',)).filter(pk=product.pk), exclude_order=order).first()
+        if locked is None: raise CartError(f"Product not found: {product.pk}")
+        item, created = OrderItem.objects.get_or_create(order=order, product=product)
+        available = locked.available_stock; previous = item.quantity
+        if action == 'add':
+            if item.quantity + quantity > available: raise CartError('Not enough stock!')
+            item.quantity += quantity
+        elif action == 'remove': item.quantity -= 1
+        item.save()
+        if item.quantity <= 0: item.delete()
+        reserve(order, {product.pk: max(item.quantity, 0)}, {product.pk: available}, {product.pk: previous})
+    return item.quantity
+
+def cart_lines(order):
+    """The order's lines and totals in one query, shaped for JSON responses."""
+    items = order.orderitem_set.select_related('product').order_by('id')
+    lines = [{'productId': i.product_id, 'name': i.product.name, 'quantity': i.quantity, 'price': str(i.product.price),
+              'lineTotal': str(i.get_total)} for i in items if i.product_id]
+    return {'lines': lines, 'items': sum(l['quantity'] for l in lines),
+            'total': str(sum((i.get_total for i in items if i.product_id), Decimal(0)))}
+
+# --- GUEST CART ---
+# Anonymous carts live in a signed cookie ({product_id: qty}), so browsing never writes to the database.
+GUEST_CART_COOKIE = 'guest_cart'
+GUEST_CART_SALT = 'guest-cart'
+GUEST_CART_MAX_LINES = 50  # keeps the cookie well under the 4KB limit
+GUEST_CART_MAX_AGE = 60 * 60 * 24 * 30
+
+def read_guest_cart(request):
+    try: raw = request.get_signed_cookie(GUEST_CART_COOKIE, salt=GUEST_CART_SALT, max_age=GUEST_CART_MAX_AGE)
+    except (KeyError, signing.BadSignature): return {}
+    try: return {int(pid): int(qty) for pid, qty in json.loads(raw).items() if int(qty) > 0}
+    except (ValueError, TypeError, AttributeError): return {}
+
+def write_guest_cart(response, cart):
+    if cart: response.set_signed_cookie(GUEST_CART_COOKIE, json.dumps(cart, separators=(',', ':')), salt=GUEST_CART_SALT,
+                                        max_age=GUEST_CART_MAX_AGE, httponly=True, samesite='Lax')
+    else: response.delete_cookie(GUEST_CART_COOKIE, samesite='Lax')
+    return response
+
+def apply_guest_operations(cart, ops):
+    """
+    Same semantics as apply_cart_operations, against the cookie cart. One query loads every product
+    involved; returns (new_cart, products) so the response can be built without another.
+    """
+    product_ids = {pid for pid, _, _ in ops}
+    products = with_holds(Product.objects).in_bulk(product_ids | set(cart))
+    missing = product_ids - set(products)
+    if missing: raise CartError(f"Product not found: {', '.join(map(str, sorted(missing)))}")
+    result = {pid: qty for pid, qty in apply_to_quantities(cart, products, ops).items() if qty > 0}
+    if len(result) > GUEST_CART_MAX_LINES: raise CartError(f"A guest cart holds at most {GUEST_CART_MAX_LINES} products, please login")
+    return result, products
+
+def guest_cart_items(cart, products=None):
+    """Unsaved OrderItems for the cookie cart (one query), so the cart templates render them unchanged."""
+    if products is None: products = Product.objects.in_bulk(list(cart))
+    return [OrderItem(product=products[pid], quantity=qty) for pid, qty in cart.items() if pid in products]
+
+def guest_cart_lines(cart, products=None):
+    items = guest_cart_items(cart, products)
+    lines = [{'productId': i.product.id, 'name': i.product.name, 'quantity': i.quantity, 'price': str(i.product.price),
+              'lineTotal': str(i.get_total)} for i in items]
+    return {'lines': lines, 'items': sum(l['quantity'] for l in lines), 'total': str(sum((i.get_total for i in items), Decimal(0)))}
+
+def merge_guest_cart(user, cart):
+    """
+    Fold a guest cart into the user's open order with one bulk upsert: quantities add up, capped at
+    the product's available stock, and are held. Returns the number of items merged.
+    """
+    if not cart: return 0
+    with transaction.atomic():
+        order, created = Order.objects.get_or_create(user=user, complete=False)
+        products = with_holds(Product.objects.select_for_update(of=('self',)), exclude_order=order).in_bulk(list(cart))
+        lines = {}
+        for item in order.orderitem_set.filter(product_id__in=list(products)): lines.setdefault(item.product_id, item)
+        create, update, merged, previous = [], [], 0, {}
+        for pid, product in products.items():
+            current = lines[pid].quantity if pid in lines else 0
+            quantity = min(current + cart[pid], max(product.available_stock, current))
+            if quantity == current: continue
+            merged += quantity - current; previous[pid] = current
+            if pid in lines: lines[pid].quantity = quantity; update.append(lines[pid])
+            else: create.append(OrderItem(order=order, product=product, quantity=quantity))
+        OrderItem.objects.bulk_create(create)
+        OrderItem.objects.bulk_update(update, ['quantity'])
+        reserve(order, {i.product_id: i.quantity for i in create + update}, {pid: p.available_stock for pid, p in products.items()}, previous)
+        transaction.on_commit(lambda: invalidate_cart(user.pk))
+    return merged
@@ -0,0 +1,90 @@
+from decimal import Decimal
+from django.core import signing
+from django.db.models import Q
+from .models import Product
+from .search import filter_matching, ranked
+from .inventory import with_holds
+
+PAGE_SIZE = 24
+
+# Every ordering ends on the primary key so the (value, id) keyset is unique and stable
+SORTS = {
+    'newest': ('-id',),
+    'price_low': ('price', 'id'),
+    'price_high': ('-price', '-id'),
+    'rating': ('-rating_avg', '-id'),
+}
+SORT_LABELS = [('newest', 'Newest'), ('price_low', 'Price: Low to High'), ('price_high', 'Price: High to Low'), ('rating', 'Avg. Customer Review')]
+DEFAULT_SORT = 'newest'
+RELEVANCE = 'relevance'  # only with a search query; BM25 order, offset cursor
+
+def get_filters(params):
+    """Normalized filter/sort values from a GET QueryDict; values that don't parse are dropped, never passed to the ORM."""
+    sort = params.get('sort'); q = (params.get('q') or '').strip()[:100]
+    return {
+        'q': q or None,
+        'category': _parse(params.get('category'), int, lambda v: 0 < v < 2 ** 63),
+        'min_price': _parse(params.get('min_price'), Decimal, _is_price),
+        'max_price': _parse(params.get('max_price'), Decimal, _is_price),
+        'rating': _parse(params.get('rating'), Decimal, lambda v: v.is_finite() and 0 <= v <= 5),
+        'sort': sort if sort in SORTS else (RELEVANCE if q else DEFAULT_SORT),
+    }
+
+def _parse(value, convert, valid):
+    try: value = convert(value.strip()) if value else None
+    except (ValueError, ArithmeticError): return None
+    return value if value is not None and valid(value) else None
+
+def _is_price(value):
+    return value.is_finite() and 0 <= value < 10 ** 8  # Product.price is max_digits=10, decimal_places=2
+
+def filter_products(filters, queryset=None):
+    products = Product.objects.all() if queryset is None else queryset
+    if filters['category']: products = products.filter(category_id=filters['category'])
+    if filters['min_price']: products = products.filter(price__gte=filters['min_price'])
+    if filters['max_price']: products = products.filter(price__lte=filters['max_price'])
+    if filters['rating']: products = products.filter(rating_avg__gte=filters['rating'])
+    return products
+
+def _after(ordering, values):
+    # (a, id) > (va, vid) in the sort direction, spelled out for backends without row comparisons
+    q = Q(); equal = {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        q |= Q(**equal, **{f"{name}__{'lt' if field.startswith('-') else 'gt'}": value})
+        equal[name] = value
+    return q
+
+def encode_cursor(sort, product):
+    return signing.dumps([sort] + [str(getattr(product, f.lstrip('-'))) for f in SORTS[sort]], salt='catalog-cursor', compress=True)
+
+def decode_cursor(sort, cursor):
+    try: data = signing.loads(cursor, salt='catalog-cursor')
+    except signing.BadSignature: return None
+    if not data or data[0] != sort: return None
+    return [Product._meta.get_field(f.lstrip('-')).to_python(v) for f, v in zip(SORTS[sort], data[1:])]
+
+def paginate(products, sort, cursor=None, size=PAGE_SIZE):
+    """One keyset page: (items, next_cursor). Each page is an index range scan however deep it is."""
+    ordering = SORTS[sort]
+    products = products.order_by(*ordering)
+    values = decode_cursor(sort, cursor) if cursor else None
+    if values: products = products.filter(_after(ordering, values))
+    items = list(products[:size + 1])
+    next_cursor = encode_cursor(sort, items[size - 1]) if len(items) > size else None
+    return items[:size], next_cursor
+
+def search_page(products, query, cursor=None, size=PAGE_SIZE):
+    try: sort, offset = signing.loads(cursor, salt='catalog-cursor') if cursor else (RELEVANCE, 0)
+    except (signing.BadSignature, ValueError): sort, offset = RELEVANCE, 0
+    if sort != RELEVANCE: offset = 0
+    items = ranked(products, query, offset, size + 1)
+    next_cursor = signing.dumps([RELEVANCE, offset + size], salt='catalog-cursor') if len(items) > size else None
+    return items[:size], next_cursor
+
+def catalog_page(filters, cursor=None, size=PAGE_SIZE):
+    """The requested page of the filtered (and optionally searched) catalog: (items, next_cursor)."""
+    products = with_holds(filter_products(filters))  # cards show available stock, same query
+    if filters['sort'] == RELEVANCE: return search_page(products, filters['q'], cursor, size)
+    if filters['q']: products = filter_matching(products, filters['q'])
+    return paginate(products, filters['sort'], cursor, size)
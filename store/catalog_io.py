@@ -0,0 +1,172 @@
+import csv
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from .models import Category, Product
+from .search import index_products
+from .listing_cache import bump_catalog_version
+
+# Bulk catalog import/export (`manage.py import_catalog` / `export_catalog` and the staff export view). Rows are
+# keyed on Product.sku and streamed a batch at a time, so memory follows the batch size, not the catalog size.
+
+FIELDS = ('sku', 'name', 'category', 'price', 'stock', 'digital', 'description', 'image')
+FORMATS = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson'}
+# Blank cells in these columns leave the stored value alone (CSV has no "missing"); the others clear it
+KEEP_IF_BLANK = {'name', 'price', 'stock', 'digital'}
+BOOLEANS = {'1': True, 'true': True, 'yes': True, 'y': True, '0': False, 'false': False, 'no': False, 'n': False}
+
+class RowError(ValueError): pass
+
+def detect_format(path, default='csv'):
+    ext = os.path.splitext(path or '')[1].lstrip('.').lower()
+    ext = {'ndjson': 'jsonl', 'json': 'jsonl'}.get(ext, ext)
+    return ext if ext in FORMATS else default
+
+# --- IMPORT ---
+def read_rows(stream, fmt):
+    """Yield (line number, row) from a text stream one row at a time: dicts for CSV, the raw line for JSONL."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader: yield reader.line_num, row
+    else:
+        for number, line in enumerate(stream, 1):
+            if line.strip(): yield number, line
+
+def clean_row(raw):
+    """Validate one input row into {field: value} for the fields it sets. Raises RowError."""
+    if isinstance(raw, str):
+        try: raw = json.loads(raw)
+        except ValueError as e: raise RowError(f'invalid JSON ({e})') from None
+        if not isinstance(raw, dict): raise RowError('expected a JSON object')
+    unknown = set(raw) - set(FIELDS)
+    if unknown: raise RowError(f"unknown field(s): {', '.join(sorted(map(str, unknown)))}")
+    row = {}
+    for field, value in raw.items():
+        value = '' if value is None else value
+        text = value.strip() if isinstance(value, str) else value
+        if text == '' and field in KEEP_IF_BLANK: continue
+        try: row[field] = CLEANERS[field](text)
+        except (ValueError, TypeError, InvalidOperation): raise RowError(f'bad {field}: {value!r}') from None
+    if not row.get('sku'): raise RowError('sku is required')
+    return row
+
+def _text(limit):
+    def clean(value):
+        value = str(value)
+        if len(value) > limit: raise ValueError
+        return value
+    return clean
+
+def _price(value):
+    price = Decimal(str(value)).quantize(Decimal('0.01'))
+    if not 0 <= price < 10 ** 8: raise ValueError  # max_digits=10
+    return price
+
+def _stock(value):
+    if isinstance(value, float) or int(value) < 0: raise ValueError
+    return int(value)
+
+def _boolean(value):
+    return value if isinstance(value, bool) else BOOLEANS[str(value).lower()]
+
+CLEANERS = {'sku': _text(64), 'name': _text(200), 'category': lambda v: _text(100)(v) or None, 'price': _price, 'stock': _stock,
+            'digital': _boolean, 'description': lambda v: str(v) or None, 'image': str}
+
+def attach_image(name, image_dir):
+    """Storage name for a row's image: copied in from image_dir when given (once), else it must already be stored."""
+    if not image_dir:
+        if not default_storage.exists(name): raise RowError(f'image {name!r} is not in media storage')
+        return name
+    root = os.path.realpath(image_dir); path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path): raise RowError(f'image {name!r} not found in {image_dir}')
+    target = os.path.relpath(path, root).replace(os.sep, '/')
+    if default_storage.exists(target) and default_storage.size(target) == os.path.getsize(path): return target  # re-import
+    with open(path, 'rb') as f: return default_storage.save(target, File(f))
+
+def _category_ids(names, known):
+    # name -> id for the batch, creating missing categories; `known` caches across batches (categories are few)
+    missing = set(names) - set(known)
+    if missing:
+        for name, pk in Category.objects.filter(name__in=missing).order_by('-pk').values_list('name', 'pk'): known[name] = pk  # oldest wins
+        new = [Category(name=name) for name in missing - set(known)]
+        for category in Category.objects.bulk_create(new): known[category.name] = category.pk
+    return known
+
+def _upsert(rows, lines, categories, image_dir, counts, on_error):
+    """
+    Write one batch ({sku: cleaned row}) as one INSERT ... ON CONFLICT (sku) DO UPDATE plus the search index.
+    Existing products are loaded first, so columns a row leaves out are written back unchanged.
+    """
+    existing = Product.objects.filter(sku__in=rows).in_bulk(field_name='sku')
+    _category_ids({row['category'] for row in rows.values() if row.get('category')}, categories)
+    products, fields = [], {'updated_at'}
+    for sku, row in rows.items():
+        product = existing.get(sku)
+        try:
+            if product is None and not {'name', 'price'} <= set(row): raise RowError('new products need a name and a price')
+            if row.get('image'): row['image'] = attach_image(row['image'], image_dir); counts['images'] += 1
+        except RowError as e:
+            counts['errors'] += 1
+            if on_error: on_error(lines[sku], sku, str(e))
+            continue
+        product = product or Product(sku=sku)
+        for field, value in row.items():
+            if field == 'category': product.category_id = categories.get(value) if value else None; fields.add('category')
+            elif field != 'sku': setattr(product, field, value); fields.add(field)
+        products.append(product)
+    # bulk_update would compile a CASE per column per row (seconds a batch); the upsert is one statement per chunk
+    Product.objects.bulk_create(products, update_conflicts=True, unique_fields=['sku'], update_fields=sorted(fields))
+    index_products([p.pk for p in products])  # bulk writes skip the post_save signal
+    created = sum(p.sku not in existing for p in products)
+    counts['created'] += created; counts['updated'] += len(products) - created
+
+def import_catalog(rows, batch_size=1000, image_dir=None, on_error=None, on_batch=None):
+    """
+    Upsert products from read_rows() output, keyed on SKU, `batch_size` rows per transaction. A SKU seen twice in
+    a batch merges, later values winning; only the columns a row sets are written. Rejected rows go to
+    on_error(line, sku, message) and are skipped; on_batch(counts) follows every batch. Returns the counts.
+    Image derivatives are left to `manage.py build_image_derivatives`.
+    """
+    counts = {'rows': 0, 'created': 0, 'updated': 0, 'errors': 0, 'images': 0}
+    categories = {}; rows = iter(rows)
+    try:
+        while batch := list(islice(rows, batch_size)):
+            cleaned, lines = {}, {}
+            for line, raw in batch:
+                counts['rows'] += 1
+                try: row = clean_row(raw)
+                except RowError as e:
+                    counts['errors'] += 1
+                    if on_error: on_error(line, raw.get('sku') if isinstance(raw, dict) else None, str(e))
+                    continue
+                cleaned.setdefault(row['sku'], {}).update(row); lines[row['sku']] = line
+            with transaction.atomic(): _upsert(cleaned, lines, categories, image_dir, counts, on_error)
+            if on_batch: on_batch(counts)
+    finally:
+        if counts['created'] or counts['updated']: bump_catalog_version()
+    return counts
+
+# --- EXPORT ---
+def export_rows(queryset=None, chunk_size=2000):
+    """Yield one {field: value} dict per product in FIELDS order, streamed with .iterator() so memory stays flat."""
+    products = (Product.objects.all() if queryset is None else queryset).order_by('pk')
+    columns = ['sku', 'name', 'category__name', 'price', 'stock', 'digital', 'description', 'image']
+    for values in products.values_list(*columns).iterator(chunk_size=chunk_size): yield dict(zip(FIELDS, values))
+
+class _Echo:
+    # csv.writer target that hands each formatted line back instead of buffering it
+    def write(self, value): return value
+
+def render_rows(rows, fmt):
+    """Yield the export as text, a line at a time: CSV with a header row, or one JSON object per line."""
+    if fmt == 'jsonl':
+        for row in rows: yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+        return
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows: yield writer.writerow(['' if value is None else value for value in row.values()])
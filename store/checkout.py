@@ -0,0 +1,60 @@
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.db.models.functions import Now
+from django.utils import timezone
+from .models import Order, OrderItem, Product
+from .cart import invalidate_cart
+from .listing_cache import bump_catalog_version
+from .inventory import held_subquery, release_order, with_holds
+from .reporting import record_order
+
+class CheckoutError(Exception): pass
+
+class OutOfStock(CheckoutError): pass
+
+def complete_order(order, transaction_id):
+    """Mark the order complete and take its lines out of stock as one atomic unit.
+
+    Stock is decremented by a single conditional UPDATE (stock >= quantity plus other carts'
+    active holds, for every line); if any line falls short nothing is written and OutOfStock
+    is raised. The order's own holds are consumed.
+    Each line's price and name, and the order's total and item count, are snapshotted
+    so history never reads (or is repriced by) Product again, and the order is added to the daily sales rollups.
+    """
+    completed_at = timezone.now()
+    try:
+        with transaction.atomic():
+            # Claiming the order first also takes SQLite's write lock before we read the lines
+            if not Order.objects.filter(pk=order.pk, complete=False).update(complete=True, transaction_id=transaction_id, completed_at=completed_at):
+                raise CheckoutError('Order is already completed')
+            lines = dict(order.orderitem_set.filter(product__isnull=False, quantity__gt=0).order_by()
+                         .values_list('product_id').annotate(qty=Sum('quantity')))
+            if not lines: raise CheckoutError('Your cart is empty')
+            held = held_subquery(exclude_order=order)
+            in_stock = reduce(or_, [Q(pk=pid, stock__gte=Value(qty) + held) for pid, qty in lines.items()])
+            updated = Product.objects.filter(in_stock).update(
+                stock=Case(*[When(pk=pid, then=F('stock') - qty) for pid, qty in lines.items()], default=F('stock')), updated_at=Now())
+            if updated != len(lines): raise OutOfStock()
+            total, item_count, items = snapshot_lines(order)
+            record_order(items, timezone.localdate(completed_at))
+            release_order(order)
+            transaction.on_commit(lambda: invalidate_cart(order.user_id))
+            transaction.on_commit(bump_catalog_version)  # stock changed under the cached listings
+    except OutOfStock:
+        # Rolled back by now, so the stock values read here are the real ones
+        short = [p.name for p in with_holds(Product.objects.filter(pk__in=lines), exclude_order=order) if p.available_stock < lines[p.pk]]
+        raise OutOfStock(f"Not enough stock for: {', '.join(short) or 'some items'}") from None
+    order.complete = True; order.transaction_id = transaction_id; order.total = total; order.item_count = item_count; order.completed_at = completed_at
+    return lines
+
+def snapshot_lines(order):
+    """Copy current price/name onto each line (one read, one bulk UPDATE) and store the order totals; returns them and the lines."""
+    items = list(order.orderitem_set.filter(product__isnull=False, quantity__gt=0).select_related('product'))
+    for item in items: item.unit_price = item.product.price; item.product_name = item.product.name
+    OrderItem.objects.bulk_update(items, ['unit_price', 'product_name'])
+    total = sum((item.unit_price * item.quantity for item in items), Decimal(0)); item_count = sum(item.quantity for item in items)
+    Order.objects.filter(pk=order.pk).update(total=total, item_count=item_count)
+    return total, item_count, items
@@ -0,0 +1,46 @@
+import hashlib
+from datetime import datetime, timezone
+from django.conf import settings
+from django.views.decorators.http import condition
+from .listing_cache import catalog_version, catalog_last_modified
+from .models import Product
+from .inventory import with_holds
+from .recommendations import recommendations_version
+
+# Conditional GET for the shared catalog pages: the validators come from the catalog version (cache)
+# or one primary-key lookup, so a 304 is answered before the view queries or renders anything.
+
+def _etag(*parts):
+    # RELEASE_ID changes on deploy, so new templates never match ETags issued by the old ones
+    return hashlib.md5(':'.join(map(str, (settings.RELEASE_ID, *parts))).encode()).hexdigest()
+
+def listing_etag(request, *args, **kwargs):
+    # The products view answers XHR with the bare partial at the same URL
+    return _etag('catalog', catalog_version(), request.headers.get('X-Requested-With', ''))
+
+def listing_last_modified(request, *args, **kwargs):
+    return catalog_last_modified()
+
+def conditional_product(request, pk):
+    # One primary-key lookup per request, shared by the validators and the view itself
+    if not hasattr(request, '_conditional_product'):
+        request._conditional_product = with_holds(Product.objects.filter(pk=pk)).first()
+    return request._conditional_product
+
+def product_etag(request, pk, **kwargs):
+    product = conditional_product(request, pk)
+    # Holds change availability, and refresh_recommendations the related products, without touching the product row;
+    # the catalog version covers the related product cards (name, price, rating, stock)
+    if product is None: return None
+    return _etag('product', pk, product.updated_at.timestamp(), product.available_stock, catalog_version(), recommendations_version())
+
+def product_last_modified(request, pk, **kwargs):
+    product = conditional_product(request, pk)
+    if product is None: return None
+    refreshed = recommendations_version()
+    stamps = [product.updated_at, catalog_last_modified()]
+    if refreshed: stamps.append(datetime.fromtimestamp(refreshed / 1000, timezone.utc))
+    return max(stamps)
+
+listing_condition = condition(etag_func=listing_etag, last_modified_func=listing_last_modified)
+product_condition = condition(etag_func=product_etag, last_modified_func=product_last_modified)
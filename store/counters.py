@@ -0,0 +1,17 @@
+from itertools import islice
+from django.db import connection
+
+def add_counts(model, keys, counters, rows, conflict=None):
+    """
+    Add `rows` ({key tuple: counter tuple}) onto the model's counter columns with INSERT ... ON CONFLICT DO UPDATE,
+    in as few statements as the backend's parameter limit allows. `conflict` defaults to the key columns.
+    """
+    qn = connection.ops.quote_name; table = qn(model._meta.db_table); columns = [*keys, *counters]
+    updates = ', '.join(f'{qn(c)} = {table}.{qn(c)} + excluded.{qn(c)}' for c in counters)
+    sql = f"INSERT INTO {table} ({', '.join(map(qn, columns))}) VALUES {{}} ON CONFLICT ({conflict or ', '.join(map(qn, keys))}) DO UPDATE SET {updates}"
+    per_statement = (connection.features.max_query_params or 10000) // len(columns)
+    rows = iter(rows.items())
+    with connection.cursor() as cursor:
+        while chunk := list(islice(rows, per_statement)):
+            values = ', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(chunk))
+            cursor.execute(sql.format(values), [value for key, counts in chunk for value in (*key, *counts)])
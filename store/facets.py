@@ -0,0 +1,38 @@
+from django.db.models import Count, Q
+from .models import Category, Product
+from .search import filter_matching
+
+# (min, max, label); same inclusive bounds the price filter applies
+PRICE_BUCKETS = [(0, 300, 'Under ₹300'), (300, 500, '₹300 - ₹500'), (500, 1000, '₹500 - ₹1,000'), (1000, 1500, '₹1,000 - ₹1,500'), (1500, 100000, 'Over ₹1,500')]
+RATING_BUCKETS = [4, 3]
+
+def _price_q(lo, hi):
+    q = Q()
+    if lo not in (None, ''): q &= Q(price__gte=lo)
+    if hi not in (None, ''): q &= Q(price__lte=hi)
+    return q
+
+def compute_facets(filters):
+    """Counts for every sidebar option under the current filters, from one GROUP BY category query.
+
+    Each facet ignores its own filter (picking a category still shows the other categories'
+    counts), so per category row we count: price+rating matches, each price bucket under the
+    rating filter, and each rating bucket under the price filter.
+    """
+    products = Product.objects.all()
+    if filters.get('q'): products = filter_matching(products, filters['q'])
+    price_q = _price_q(filters.get('min_price'), filters.get('max_price'))
+    rating_q = Q(rating_avg__gte=filters['rating']) if filters.get('rating') else Q()
+    rows = products.order_by().values('category_id').annotate(
+        matches=Count('id', filter=price_q & rating_q),
+        **{f'price_{i}': Count('id', filter=_price_q(lo, hi) & rating_q) for i, (lo, hi, _) in enumerate(PRICE_BUCKETS)},
+        **{f'rating_{n}': Count('id', filter=Q(rating_avg__gte=n) & price_q) for n in RATING_BUCKETS},
+    )
+    by_category = {row['category_id']: row for row in rows}
+    selected = [row for cat_id, row in by_category.items() if not filters.get('category') or cat_id == filters['category']]
+    return {
+        'all': sum(row['matches'] for row in by_category.values()),
+        'categories': [{'id': c.id, 'name': c.name, 'count': by_category[c.id]['matches'] if c.id in by_category else 0} for c in Category.objects.all()],
+        'price': [{'value': f'{lo}-{hi}', 'label': label, 'count': sum(row[f'price_{i}'] for row in selected)} for i, (lo, hi, label) in enumerate(PRICE_BUCKETS)],
+        'rating': [{'value': n, 'count': sum(row[f'rating_{n}'] for row in selected)} for n in RATING_BUCKETS],
+    }
@@ -0,0 +1,45 @@
+import os
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# name -> target width in px; images are never upscaled
+SIZES = {'thumb': 160, 'card': 400, 'detail': 900}
+FORMATS = {'webp': {'format': 'WEBP', 'quality': 80, 'method': 4}, 'jpg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}}
+DERIVATIVE_DIR = 'derivatives'
+# What generate_derivatives raises for a bad upload or storage trouble: PIL's UnidentifiedImageError is an OSError
+IMAGE_ERRORS = (OSError, ValueError, Image.DecompressionBombError, SuspiciousFileOperation)
+
+def derivative_name(image_name, size, ext):
+    stem = os.path.splitext(image_name)[0]
+    return f'{DERIVATIVE_DIR}/{stem}-{SIZES[size]}.{ext}'
+
+def has_derivatives(image_name):
+    return default_storage.exists(derivative_name(image_name, 'card', 'webp'))
+
+def generate_derivatives(image_name, force=False):
+    """Write every size/format of one uploaded image into MEDIA_ROOT/derivatives. Returns files written.
+
+    Touches storage only (no database), so it is safe to run in worker processes.
+    """
+    if not image_name or (not force and has_derivatives(image_name)): return 0
+    with default_storage.open(image_name, 'rb') as f:
+        original = ImageOps.exif_transpose(Image.open(f))
+        original.load()
+    if original.mode not in ('RGB', 'L'):
+        # JPEG has no alpha: flatten transparent PNGs onto white
+        background = Image.new('RGB', original.size, 'white')
+        background.paste(original, mask=original.convert('RGBA').split()[-1])
+        original = background
+    written = 0
+    for size, width in SIZES.items():
+        resized = original.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+        for ext, options in FORMATS.items():
+            buffer = BytesIO(); resized.convert('RGB').save(buffer, **options)
+            name = derivative_name(image_name, size, ext)
+            if default_storage.exists(name): default_storage.delete(name)
+            default_storage.save(name, ContentFile(buffer.getvalue())); written += 1
+    return written
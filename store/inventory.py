@@ -0,0 +1,63 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Now
+from django.utils import timezone
+from .models import Product, Reservation
+from .listing_cache import bump_catalog_version, expire_catalog_version_at
+
+# Adding to a cart holds the units for the TTL (from the line's last change); checkout consumes the
+# holds, `manage.py expire_reservations` deletes the stale ones. Guest (cookie) carts respect holds but place none.
+
+def reservation_ttl(): return timedelta(seconds=getattr(settings, 'CART_RESERVATION_TTL', 15 * 60))
+
+def active_holds(exclude_order=None):
+    holds = Reservation.objects.filter(expires_at__gt=Now())
+    return holds.exclude(order=exclude_order) if exclude_order else holds
+
+def held_subquery(exclude_order=None, product_ref='pk'):
+    # Correlated SUM over reservation_active_idx: (product, expires_at > now) is an index range, quantity is in the index
+    holds = active_holds(exclude_order).filter(product=OuterRef(product_ref)).order_by().values('product').annotate(n=Sum('quantity')).values('n')
+    return Coalesce(Subquery(holds, output_field=IntegerField()), Value(0))
+
+def with_holds(queryset, exclude_order=None):
+    """Annotate `held` (other carts' active holds) so Product.available_stock is right, in the same query."""
+    return queryset.annotate(held=held_subquery(exclude_order))
+
+def available_stock(product_ids, exclude_order=None):
+    """{product_id: units still available}, one query; `exclude_order`'s own holds count as available to it."""
+    return {p.pk: p.available_stock for p in with_holds(Product.objects.filter(pk__in=product_ids).only('stock'), exclude_order)}
+
+def reserve(order, quantities, available, previous):
+    """
+    Hold `quantities` ({product_id: units}, 0 releases) for the order until now + TTL; call inside the caller's
+    transaction. `available` is {product_id: available_stock excluding this order}, as checked by the caller, and
+    `previous` the cart's quantities before the change (standing in for the old holds). Bumps the catalog version
+    when a product sells out or comes back, since listings only show in/out of stock, and again when holds that
+    keep one sold out expire.
+    """
+    expires_at = timezone.now() + reservation_ttl()
+    holds = [Reservation(order=order, product_id=pid, quantity=qty, expires_at=expires_at) for pid, qty in quantities.items() if qty > 0]
+    Reservation.objects.bulk_create(holds, update_conflicts=True, unique_fields=['order', 'product'], update_fields=['quantity', 'expires_at'])
+    released = [pid for pid, qty in quantities.items() if qty <= 0 and previous.get(pid)]
+    if released: Reservation.objects.filter(order=order, product_id__in=released).delete()
+    if any((available[pid] - previous.get(pid, 0) > 0) != (available[pid] - qty > 0) for pid, qty in quantities.items() if pid in available):
+        transaction.on_commit(bump_catalog_version)
+    # A product these holds keep sold out comes back when they expire: have the listings follow then
+    if any(qty > 0 and available[pid] - qty <= 0 for pid, qty in quantities.items() if pid in available):
+        transaction.on_commit(lambda: expire_catalog_version_at(expires_at))
+
+def release_order(order):
+    """Drop every hold of the order (checkout took the stock, or the cart was abandoned)."""
+    return Reservation.objects.filter(order=order).delete()[0]
+
+def expire_reservations(batch_size=1000):
+    """Delete expired holds in batches of primary keys; returns how many were removed."""
+    removed = 0
+    while True:
+        ids = list(Reservation.objects.filter(expires_at__lte=Now()).values_list('pk', flat=True)[:batch_size])
+        if not ids: break
+        removed += Reservation.objects.filter(pk__in=ids).delete()[0]
+    if removed: bump_catalog_version()  # sold-out products may be back
+    return removed
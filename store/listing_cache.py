@@ -0,0 +1,102 @@
+import hashlib
+import json
+import time
+from datetime import datetime, timezone
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+VERSION_KEY, MODIFIED_KEY = 'catalog:version', 'catalog:modified'
+HITS_KEY, MISSES_KEY = 'catalog:hits', 'catalog:misses'
+EXPIRES_KEY, EXPIRES_MAX = 'catalog:expires', 1000  # scheduled bumps: unix times, soonest first
+LISTING_TIMEOUT = 60 * 10  # old versions are never read again, this just bounds their lifetime
+
+def catalog_version():
+    # Seeded from the clock, so a restarted or flushed cache never reissues a version (and ETag) seen before
+    values = cache.get_many([VERSION_KEY, EXPIRES_KEY]); version = values.get(VERSION_KEY)
+    pending = _pending(values.get(EXPIRES_KEY))
+    if pending is not None:
+        cache.set(EXPIRES_KEY, pending, None) if pending else cache.delete(EXPIRES_KEY)
+        bump_catalog_version(); version = None
+    if version is None:
+        cache.add(VERSION_KEY, int(time.time() * 1000), None); version = cache.get(VERSION_KEY, 1)
+    return version
+
+async def acatalog_version():
+    values = await cache.aget_many([VERSION_KEY, EXPIRES_KEY]); version = values.get(VERSION_KEY)
+    pending = _pending(values.get(EXPIRES_KEY))
+    if pending is not None:
+        await (cache.aset(EXPIRES_KEY, pending, None) if pending else cache.adelete(EXPIRES_KEY))
+        await sync_to_async(bump_catalog_version)(); version = None
+    if version is None:
+        await cache.aadd(VERSION_KEY, int(time.time() * 1000), None); version = await cache.aget(VERSION_KEY, 1)
+    return version
+
+def _pending(expiries):
+    # The scheduled bumps still ahead, or None if none has come due
+    now = time.time()
+    if not expiries or expiries[0] > now: return None
+    return [t for t in expiries if t > now]
+
+def expire_catalog_version_at(when):
+    """
+    Schedule a bump for `when` (a datetime): a cart hold that sells a product out shows on listings until it
+    expires, and nothing writes when it does. Best effort (concurrent schedules can drop an entry):
+    `manage.py expire_reservations` bumps too once it deletes the hold.
+    """
+    expiries = cache.get(EXPIRES_KEY) or []
+    stamp = when.timestamp()
+    if stamp not in expiries: cache.set(EXPIRES_KEY, sorted([*expiries, stamp])[:EXPIRES_MAX], None)
+
+def bump_catalog_version():
+    """Called on any Product/Category/Review write (and stock changes); orphans every cached listing at once."""
+    try: cache.incr(VERSION_KEY)
+    except ValueError: cache.set(VERSION_KEY, int(time.time() * 1000), None)
+    cache.set(MODIFIED_KEY, time.time(), None)
+
+def catalog_last_modified():
+    """When the catalog last changed. A cold cache claims "now", like a fresh version: never a false 304, no query."""
+    stamp = cache.get(MODIFIED_KEY)
+    if stamp is None:
+        cache.add(MODIFIED_KEY, time.time(), None); stamp = cache.get(MODIFIED_KEY, time.time())
+    return datetime.fromtimestamp(stamp, tz=timezone.utc)
+
+def _count(key):
+    # Best effort: the key can vanish between add and incr (eviction, DummyCache)
+    try: cache.incr(key)
+    except ValueError: cache.add(key, 1, None)
+
+async def _acount(key):
+    try: await cache.aincr(key)
+    except ValueError: await cache.aadd(key, 1, None)
+
+def cache_key(kind, params, version=None):
+    # params is the normalized filter dict (+ cursor); None values and ordering don't change the key
+    normalized = json.dumps(sorted((k, str(v)) for k, v in params.items() if v is not None))
+    return f'catalog:v{version or catalog_version()}:{kind}:{hashlib.md5(normalized.encode()).hexdigest()}'
+
+def cached(kind, params, build):
+    key = cache_key(kind, params)
+    value = cache.get(key)
+    if value is None:
+        _count(MISSES_KEY)
+        value = build()
+        cache.set(key, value, LISTING_TIMEOUT)
+    else:
+        _count(HITS_KEY)
+    return value
+
+async def acached(kind, params, build):
+    """cached() for async views: cache round trips stay on the event loop, only a miss runs the sync build() in a thread."""
+    key = cache_key(kind, params, await acatalog_version())
+    value = await cache.aget(key)
+    if value is None:
+        await _acount(MISSES_KEY)
+        value = await sync_to_async(build)()
+        await cache.aset(key, value, LISTING_TIMEOUT)
+    else:
+        await _acount(HITS_KEY)
+    return value
+
+def stats():
+    hits, misses = cache.get(HITS_KEY, 0), cache.get(MISSES_KEY, 0)
+    return {'version': catalog_version(), 'hits': hits, 'misses': misses, 'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None}
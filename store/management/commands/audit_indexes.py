@@ -0,0 +1,95 @@
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from store.models import Category, Order, OrderItem, Product, User, Wishlist
+
+FULL_SCAN = re.compile(r'^SCAN (\w+)$')  # "SCAN t USING [COVERING] INDEX ..." walks an index, which is fine
+TEMP_BTREE = 'USE TEMP B-TREE'
+LIMIT = re.compile(r'\bLIMIT \d+\s*$')
+
+
+class Command(BaseCommand):
+    help = ("Replay the main views' queries under EXPLAIN QUERY PLAN and flag full table scans and temp B-tree sorts. "
+            "Runs as a throwaway probe user inside a rolled-back transaction, with caching disabled.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=500, help="Ignore full scans of tables smaller than this")
+        parser.add_argument('--verbose-plans', action='store_true', help="Print every plan, not just the flagged ones")
+        parser.add_argument('--analyze', action='store_true', help="Refresh the planner statistics (ANALYZE) first; kept afterwards")
+        parser.add_argument('--fail-on-findings', action='store_true', help="Exit non-zero when anything is flagged (for CI)")
+
+    def handle(self, *args, **o):
+        if connection.vendor != 'sqlite': raise CommandError("audit_indexes reads SQLite query plans.")
+        products = list(Product.objects.order_by('id')[:3])
+        if not products: raise CommandError("No products; run `manage.py seed_store` first.")
+        self.sizes = {}; findings = 0
+        if o['analyze']:
+            with connection.cursor() as cursor: cursor.execute('ANALYZE')
+        with transaction.atomic(), override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+                                                     ALLOWED_HOSTS=['testserver']):
+            client = self.probe_client(products)
+            for label, url in self.pages(products):
+                with CaptureQueriesContext(connection) as captured:
+                    client.get(url)
+                findings += self.audit(label, [q['sql'] for q in captured.captured_queries], o)
+            transaction.set_rollback(True)
+        style = self.style.WARNING if findings else self.style.SUCCESS
+        self.stdout.write(style(f"{findings} finding(s)."))
+        if findings and not o['analyze']: self.stdout.write("Without statistics SQLite guesses between indexes; re-run with --analyze before adding more.")
+        if findings and o['fail_on_findings']: raise CommandError("Query plan audit failed.")
+
+    def probe_client(self, products):
+        user = User.objects.create(username='audit-probe', email='audit-probe@example.invalid', address='1 Probe St')
+        done = Order.objects.create(user=user, complete=True, transaction_id='TXN-AUDIT')
+        cart = Order.objects.create(user=user, complete=False)
+        for p in products:
+            OrderItem.objects.create(order=done, product=p, quantity=1); OrderItem.objects.create(order=cart, product=p, quantity=1)
+            Wishlist.objects.create(user=user, product=p)
+        client = Client(); client.force_login(user)
+        return client
+
+    def pages(self, products):
+        category = Category.objects.values_list('id', flat=True).first()
+        products_url = reverse('products')
+        yield 'home', reverse('home')
+        for sort in ('newest', 'price_low', 'price_high', 'rating'):
+            yield f'products sort={sort}', f'{products_url}?sort={sort}'
+        if category:
+            for sort in ('newest', 'price_low', 'rating'):
+                yield f'products category + {sort}', f'{products_url}?category={category}&sort={sort}'
+            yield 'products category + rating>=4', f'{products_url}?category={category}&rating=4'
+        yield 'products price range', f'{products_url}?min_price=300&max_price=500&sort=price_low'
+        yield 'search', f"{reverse('search')}?q={products[0].name.split()[0]}"
+        yield 'product_detail', reverse('product_detail', args=[products[0].id])
+        for name in ('cart', 'checkout', 'wishlist', 'profile'): yield name, reverse(name)
+
+    def audit(self, label, queries, o):
+        flagged = []
+        for sql in dict.fromkeys(q for q in queries if q.lstrip().upper().startswith('SELECT')):
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = [row[3] for row in cursor.fetchall()]
+            problems = [step for step in plan if self.is_problem(step, plan, sql, o['min_rows'])]
+            if problems or o['verbose_plans']: flagged.append((sql, plan, problems))
+        problems = sum(len(p) for _, _, p in flagged)
+        self.stdout.write(f"{label:<32} {len(queries):>3} queries  " + (self.style.WARNING(f"{problems} flagged") if problems else 'ok'))
+        for sql, plan, found in flagged:
+            self.stdout.write(f"    {sql[:160]}{'...' if len(sql) > 160 else ''}")
+            for step in plan: self.stdout.write(f"      {'!!' if step in found else '  '} {step}")
+        return problems
+
+    def is_problem(self, step, plan, sql, min_rows):
+        if TEMP_BTREE in step:
+            return not any('VIRTUAL TABLE' in s for s in plan)  # FTS rank order (bm25) can't come from an index
+        match = FULL_SCAN.match(step)
+        if not match: return False
+        # A scan already in ORDER BY order that stops at LIMIT (e.g. newest first by rowid) reads one page
+        if LIMIT.search(sql) and not any(TEMP_BTREE in s for s in plan): return False
+        table = match.group(1)
+        if table not in self.sizes:
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT COUNT(*) FROM "{table}"'); self.sizes[table] = cursor.fetchone()[0]
+        return self.sizes[table] >= min_rows
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from store.ratings import rebuild_rating_aggregates
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized rating count/sum/average/histogram on every Product from its reviews."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        updated = rebuild_rating_aggregates(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rating aggregates rebuilt for {updated} products."))
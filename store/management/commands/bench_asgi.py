@@ -0,0 +1,36 @@
+import tempfile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from store.benchmark import run_isolated
+
+MODES = {
+    'wsgi': ({'ZENSTORE_ASYNC_VIEWS': '0'}, []),  # sync views, one thread per concurrent request
+    'asgi': ({'ZENSTORE_ASYNC_VIEWS': '1'}, ['--asgi']),  # async views on one event loop
+}
+
+
+class Command(BaseCommand):
+    help = ("Compare the hot AJAX endpoints under WSGI (sync views, threads) and ASGI (async views, one event loop). Each "
+            "mode runs bench_views in a subprocess against its own copy of the SQLite database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', default='update_item,toggle_wishlist,products_partial,initiate_payment')
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--profile', default='production', help="ZENSTORE_ENV for both runs")
+
+    def handle(self, *args, **o):
+        if connection.vendor != 'sqlite': raise CommandError("bench_asgi snapshots the SQLite database; run bench_views (with --asgi) directly on PostgreSQL.")
+        workdir = tempfile.mkdtemp(prefix='bench_asgi_')
+        common = ['--scenarios', o['scenarios'], '--requests', str(o['requests']), '--concurrency', str(o['concurrency'])]
+        results = {mode: run_isolated(workdir, mode, {**env, 'ZENSTORE_ENV': o['profile']}, common + extra) for mode, (env, extra) in MODES.items()}
+
+        self.stdout.write(f"{'scenario':<18} {'mode':<5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'q/req':>6} {'errors':>7}")
+        for name in results['wsgi']:
+            for mode in MODES:
+                r = results[mode][name]
+                self.stdout.write(f"{name:<18} {mode:<5} {r['rps']:>8.1f} {r['p50_ms']:>6.1f}ms {r['p95_ms']:>6.1f}ms {r['p99_ms']:>6.1f}ms "
+                                  f"{r['queries_per_request']:>6.1f} {r['errors']:>7}")
+            wsgi, asgi = results['wsgi'][name], results['asgi'][name]
+            if wsgi['rps']: self.stdout.write(f"{'':<18} asgi/wsgi req/s x{asgi['rps'] / wsgi['rps']:.2f}, p99 x{asgi['p99_ms'] / (wsgi['p99_ms'] or 1):.2f}")
+        self.stdout.write(f"Databases and JSON results kept in {workdir}")
@@ -0,0 +1,44 @@
+import datetime
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from store.models import DailyProductSales, OrderItem
+from store.reporting import sales_report
+
+
+def naive_report(start, end, top=20):
+    """The report straight from the order lines: what sales_report answered before the rollups existed."""
+    lines = OrderItem.objects.filter(order__complete=True, quantity__gt=0).annotate(
+        day=TruncDate(Coalesce('order__completed_at', 'order__date_ordered'))).filter(day__gte=start, day__lte=end).order_by()
+    sums = {'units': Sum('quantity'), 'orders': Count('order', distinct=True),
+            'revenue': Sum(F('quantity') * Coalesce('unit_price', 'product__price'), output_field=DecimalField(max_digits=14, decimal_places=2))}
+    return {'daily': list(lines.values('day').annotate(**sums).order_by('day')),
+            'categories': list(lines.values('product__category_id', 'product__category__name').annotate(**sums).order_by('-revenue')),
+            'products': list(lines.filter(product__isnull=False).values('product_id', 'product__name').annotate(**sums).order_by('-revenue')[:top])}
+
+
+class Command(BaseCommand):
+    help = ("Time the sales report from the daily rollups against the naive order-line aggregate, on the current "
+            "database (seed first, e.g. `seed_store --orders 400000` for about a million lines).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, nargs='+', default=[7, 30, 365], help="Report ranges to time, ending today")
+        parser.add_argument('--repeats', type=int, default=5)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{OrderItem.objects.count()} order lines, {DailyProductSales.objects.count()} product-day rollup rows")
+        end = timezone.localdate()
+        for days in options['days']:
+            start = end - datetime.timedelta(days=days - 1)
+            naive = self.time(lambda: naive_report(start, end), options['repeats'])
+            rollup = self.time(lambda: sales_report(start, end), options['repeats'])
+            self.stdout.write(f"{days:>4} days: naive p50 {naive:9.1f} ms   rollups p50 {rollup:7.1f} ms   ({naive / rollup:.0f}x)")
+
+    def time(self, fn, repeats):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter(); fn(); timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,61 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from store.catalog import get_filters, filter_products
+from store.models import Category, Product
+from store.search import rebuild_index, ranked, ranked_like, use_fts
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+
+class Command(BaseCommand):
+    help = "Benchmark FTS5 search against the LIKE fallback on a synthetic catalog (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--vocabulary', type=int, default=5000, help="Distinct words, drawn with a Zipf-like skew")
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not use_fts():
+            self.stderr.write("FTS5 benchmark needs the SQLite backend."); return
+        rng = random.Random(options['seed'])
+        self.words = sorted({''.join(rng.choices(LETTERS, k=rng.randint(4, 9))) for _ in range(options['vocabulary'])})
+        self.weights = [1 / (i + 1) for i in range(len(self.words))]
+        with transaction.atomic():
+            self.seed(rng, options['products'])
+            queries = [' '.join(self.pick(rng, rng.choice((1, 2)))) for _ in range(options['queries'])]
+            base = filter_products(get_filters({}))
+            fts = self.time(lambda q: ranked(base, q, 0, 24), queries)
+            like = self.time(lambda q: ranked_like(base, q, 0, 24), queries)
+            for label, timings in (('fts5 bm25', fts), ('LIKE fallback', like)):
+                self.report(label, timings)
+            transaction.set_rollback(True)
+
+    def pick(self, rng, k):
+        return rng.choices(self.words, weights=self.weights, k=k)
+
+    def seed(self, rng, count):
+        start = time.perf_counter()
+        categories = Category.objects.bulk_create([Category(name=' '.join(self.pick(rng, 2)).title()) for _ in range(20)])
+        for offset in range(0, count, 5000):
+            Product.objects.bulk_create([Product(
+                name=' '.join(self.pick(rng, 3)).title(), price=rng.randint(99, 5000),
+                description=' '.join(self.pick(rng, 30)), category=rng.choice(categories),
+            ) for _ in range(min(5000, count - offset))])
+        rebuild_index()
+        self.stdout.write(f"Seeded and indexed {count} products in {time.perf_counter() - start:.1f}s")
+
+    def time(self, fn, queries):
+        timings = []
+        for q in queries:
+            start = time.perf_counter(); fn(q); timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def report(self, label, timings):
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(f"{label:>14}: p50 {statistics.median(timings):7.2f} ms   p95 {p95:7.2f} ms   max {timings[-1]:7.2f} ms")
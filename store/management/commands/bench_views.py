@@ -0,0 +1,121 @@
+import json
+import logging
+import random
+import platform
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from store.benchmark import compare, run_async_scenario, run_scenario
+from store.models import Category, Product, User
+
+SCENARIOS = ['home', 'products', 'products_filtered', 'products_partial', 'product_detail', 'cart', 'update_item', 'cart_batch',
+             'toggle_wishlist', 'initiate_payment', 'verify_payment']
+
+
+class Command(BaseCommand):
+    help = "Load-test the main views through the Django test client and report throughput, latency percentiles and queries per request."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help=f"Comma separated subset of: {', '.join(SCENARIOS)}")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per scenario")
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', dest='json_path', help="Write the results here, for comparing runs")
+        parser.add_argument('--compare', dest='baseline_path', help="Print deltas against an earlier --json file")
+        parser.add_argument('--asgi', action='store_true', help="Go through the ASGI handler (AsyncClient, one event loop) instead of "
+                                                               "WSGI threads; set ZENSTORE_ASYNC_VIEWS=1 to get the async views too")
+
+    def handle(self, *args, **o):
+        names = [n.strip() for n in o['scenarios'].split(',') if n.strip()]
+        unknown = set(names) - set(SCENARIOS)
+        if unknown: raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        self.product_ids = list(Product.objects.filter(stock__gt=0).values_list('id', flat=True))
+        if not self.product_ids: raise CommandError("No products in stock; run `manage.py seed_store` first.")
+        self.category_ids = list(Category.objects.values_list('id', flat=True)) or [None]
+        self.seed = o['seed']; self.asgi = o['asgi']
+        if o['verbosity'] < 2:  # per-request log lines and 500 tracebacks skew timings; errors are still counted
+            logging.getLogger('store.metrics').setLevel(logging.WARNING); logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+        results = {}
+        runner = run_async_scenario if self.asgi else run_scenario
+        # Server-Timing carries the query count out of the ASGI request threads
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'], SERVER_TIMING_HEADER=self.asgi):
+            for name in names:
+                request, prepare = getattr(self, f'scenario_{name}')()
+                results[name] = runner(request, o['requests'], o['concurrency'], setup=self.setup_worker, prepare=prepare)
+                self.report(name, results[name])
+
+        if o['baseline_path']:
+            with open(o['baseline_path']) as f: baseline = json.load(f)['results']
+            for name, delta in compare(results, baseline).items():
+                self.stdout.write(f"  vs baseline {name:<18} " + '  '.join(f"{k} {v:+}" for k, v in delta.items()))
+        if o['json_path']:
+            meta = {'timestamp': timezone.now().isoformat(), 'vendor': connection.vendor, 'python': platform.python_version(),
+                    'debug': settings.DEBUG, 'asgi': self.asgi, 'async_views': settings.ASYNC_VIEWS, 'concurrency': o['concurrency'], 'requests': o['requests'], 'seed': o['seed'],
+                    'products': len(self.product_ids)}
+            with open(o['json_path'], 'w') as f: json.dump({'meta': meta, 'results': results}, f, indent=2)
+            self.stdout.write(f"Results written to {o['json_path']}")
+
+    def setup_worker(self, index):
+        user, created = User.objects.get_or_create(username=f'bench{index}', defaults={'email': f'bench{index}@example.com'})
+        client = (AsyncClient if self.asgi else Client)(raise_request_exception=False); client.force_login(user)  # a 500 counts as an error
+        return {'client': client, 'rng': random.Random(self.seed * 1000 + index)}
+
+    def add_to_cart(self, state, i):
+        return state['client'].post(reverse('update_item'), json.dumps({'productId': state['rng'].choice(self.product_ids), 'action': 'add'}),
+                                    content_type='application/json')
+
+    # Each scenario returns (request, prepare); only `request` is timed.
+    def scenario_home(self):
+        return (lambda s, i: s['client'].get(reverse('home'))), None
+
+    def scenario_products(self):
+        return (lambda s, i: s['client'].get(reverse('products'))), None
+
+    def scenario_products_filtered(self):
+        def request(s, i):
+            rng = s['rng']; params = {'sort': rng.choice(['newest', 'price_low', 'price_high', 'rating']), 'rating': rng.choice(['', '3', '4'])}
+            category = rng.choice(self.category_ids)
+            if category: params['category'] = category
+            return s['client'].get(reverse('products'), params)
+        return request, None
+
+    def scenario_products_partial(self):
+        def request(s, i):
+            rng = s['rng']; params = {'sort': rng.choice(['newest', 'price_low', 'price_high', 'rating'])}
+            category = rng.choice(self.category_ids)
+            if category: params['category'] = category
+            return s['client'].get(reverse('products_partial'), params)
+        return request, None
+
+    def scenario_product_detail(self):
+        return (lambda s, i: s['client'].get(reverse('product_detail', args=[s['rng'].choice(self.product_ids)]))), None
+
+    def scenario_cart(self):
+        return (lambda s, i: s['client'].get(reverse('cart'))), (lambda s, i: i == 0 and self.add_to_cart(s, i))
+
+    def scenario_update_item(self):
+        return self.add_to_cart, None
+
+    def scenario_cart_batch(self):
+        def request(s, i):
+            ops = [{'productId': pid, 'action': 'add', 'quantity': 1} for pid in s['rng'].sample(self.product_ids, min(3, len(self.product_ids)))]
+            return s['client'].post(reverse('update_cart_batch'), json.dumps({'operations': ops}), content_type='application/json')
+        return request, None
+
+    def scenario_toggle_wishlist(self):
+        return (lambda s, i: s['client'].post(reverse('toggle_wishlist'), json.dumps({'productId': s['rng'].choice(self.product_ids)}),
+                                              content_type='application/json')), None
+
+    def scenario_initiate_payment(self):
+        return (lambda s, i: s['client'].post(reverse('initiate_payment'))), None
+
+    def scenario_verify_payment(self):
+        return (lambda s, i: s['client'].post(reverse('verify_payment'))), self.add_to_cart
+
+    def report(self, name, r):
+        self.stdout.write(f"{name:<18} {r['requests']:>5} req  {r['rps']:>7.1f} req/s  p50 {r['p50_ms']:>7.1f}ms  p95 {r['p95_ms']:>7.1f}ms  "
+                          f"p99 {r['p99_ms']:>7.1f}ms  {r['queries_per_request']:>5.1f} q/req  {r['errors']} errors")
@@ -0,0 +1,27 @@
+import tempfile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from store.benchmark import run_isolated
+
+
+class Command(BaseCommand):
+    help = ("Compare concurrent cart writes (update_item, cart_batch) under each settings profile. Each profile runs "
+            "bench_views in a subprocess against its own copy of the SQLite database, so journal modes don't leak.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', default='development,production')
+        parser.add_argument('--scenarios', default='update_item,cart_batch')
+        parser.add_argument('--requests', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, default=8)
+
+    def handle(self, *args, **o):
+        if connection.vendor != 'sqlite': raise CommandError("bench_writes compares SQLite profiles; run bench_views directly on PostgreSQL.")
+        workdir = tempfile.mkdtemp(prefix='bench_writes_')
+        args = ['--scenarios', o['scenarios'], '--requests', str(o['requests']), '--concurrency', str(o['concurrency'])]
+        results = {profile: run_isolated(workdir, profile, {'ZENSTORE_ENV': profile}, args) for profile in o['profiles'].split(',')}
+
+        self.stdout.write(f"{'profile':<13} {'scenario':<12} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+        for profile, scenarios in results.items():
+            for name, r in scenarios.items():
+                self.stdout.write(f"{profile:<13} {name:<12} {r['rps']:>8.1f} {r['p50_ms']:>6.1f}ms {r['p95_ms']:>6.1f}ms {r['p99_ms']:>6.1f}ms {r['errors']:>7}")
+        self.stdout.write(f"Databases and JSON results kept in {workdir}")
@@ -0,0 +1,30 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import django
+from django.core.management.base import BaseCommand
+from store.images import generate_derivatives
+from store.models import Category, Product
+
+
+def _generate(name, force):
+    try: return name, generate_derivatives(name, force), None
+    except Exception as e: return name, 0, str(e)
+
+
+class Command(BaseCommand):
+    help = "Generate thumb/card/detail WebP and JPEG derivatives for every Product and Category image."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+        parser.add_argument('--force', action='store_true', help="Regenerate even if derivatives exist")
+
+    def handle(self, *args, **options):
+        names = set(Product.objects.exclude(image='').exclude(image=None).values_list('image', flat=True))
+        names |= set(Category.objects.exclude(image='').exclude(image=None).values_list('image', flat=True))
+        written = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            futures = [pool.submit(_generate, name, options['force']) for name in sorted(names)]
+            for future in as_completed(futures):
+                name, count, error = future.result()
+                if error: failed += 1; self.stderr.write(f"{name}: {error}")
+                else: written += count
+        self.stdout.write(self.style.SUCCESS(f"{len(names)} images processed, {written} derivative files written, {failed} failed."))
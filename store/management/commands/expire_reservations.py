@@ -0,0 +1,19 @@
+import time
+from django.core.management.base import BaseCommand
+from store.inventory import expire_reservations
+
+
+class Command(BaseCommand):
+    help = "Delete expired cart reservations in batches, returning their units to available stock."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help="Keep sweeping instead of exiting after one pass")
+        parser.add_argument('--interval', type=float, default=30.0, help="Seconds between sweeps with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            removed = expire_reservations(options['batch_size'])
+            if removed or not options['loop']: self.stdout.write(f"Reservations: {removed} expired.")
+            if not options['loop']: break
+            time.sleep(options['interval'])
@@ -0,0 +1,23 @@
+import sys
+from django.core.management.base import BaseCommand
+from store.catalog_io import FORMATS, detect_format, export_rows, render_rows
+
+
+class Command(BaseCommand):
+    help = "Stream every product to a CSV or JSONL file (or stdout) in the format import_catalog reads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-', help="Output file, or - for stdout (default)")
+        parser.add_argument('--format', choices=sorted(FORMATS), help="Default: from the file extension, else csv")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+        to_stdout = options['path'] == '-'
+        out = sys.stdout if to_stdout else open(options['path'], 'w', newline='', encoding='utf-8')
+        lines = 0
+        try:
+            for line in render_rows(export_rows(chunk_size=options['chunk_size']), fmt): out.write(line); lines += 1
+        finally:
+            if not to_stdout: out.close()
+        if not to_stdout: self.stdout.write(self.style.SUCCESS(f"{lines - (fmt == 'csv')} products exported to {options['path']}."))
@@ -0,0 +1,35 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from store.catalog_io import FORMATS, detect_format, import_catalog, read_rows
+
+
+class Command(BaseCommand):
+    help = "Upsert products from a CSV or JSONL file (or stdin), keyed on SKU, streaming in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin")
+        parser.add_argument('--format', choices=sorted(FORMATS), help="Default: from the file extension, else csv")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--images', metavar='DIR', help="Copy each row's image from this directory into media storage")
+        parser.add_argument('--progress', type=int, default=10000, help="Report progress every N rows")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['path'])
+        progress = {'next': options['progress']}
+
+        def on_error(line, sku, message):
+            self.stderr.write(f"line {line}{f' ({sku})' if sku else ''}: {message}")
+
+        def on_batch(counts):
+            if counts['rows'] < progress['next']: return
+            progress['next'] = counts['rows'] + options['progress']
+            self.stdout.write(f"{counts['rows']} rows: {counts['created']} created, {counts['updated']} updated, {counts['errors']} errors")
+
+        try: stream = sys.stdin if options['path'] == '-' else open(options['path'], newline='', encoding='utf-8-sig')
+        except OSError as e: raise CommandError(e)
+        with stream:
+            counts = import_catalog(read_rows(stream, fmt), options['batch_size'], options['images'], on_error, on_batch)
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['rows']} rows: {counts['created']} created, {counts['updated']} updated, {counts['errors']} rejected, "
+            f"{counts['images']} images attached."))
+        if counts['images']: self.stdout.write("Run `manage.py build_image_derivatives` to generate their resized versions.")
@@ -0,0 +1,17 @@
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from store.reporting import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily sales rollups (per day, product and category) from completed orders."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only rebuild days from this ISO date on (default: all history)")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try: since = datetime.date.fromisoformat(options['since']) if options['since'] else None
+        except ValueError: raise CommandError(f"--since must be an ISO date, not {options['since']!r}")
+        written = rebuild_rollups(since, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS("Rollups rebuilt: " + ', '.join(f'{n} {name}' for name, n in written.items()) + "."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from store.search import rebuild_index, use_fts
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FTS5 product search index from Product/Category (SQLite only)."
+
+    def handle(self, *args, **options):
+        if not use_fts():
+            self.stdout.write("Not on SQLite: search uses the LIKE fallback, nothing to rebuild."); return
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt with {count} products."))
@@ -0,0 +1,77 @@
+import random
+from datetime import timedelta
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from store.listing_cache import bump_catalog_version
+from store.models import Category, Order, OrderItem, Product, Review, User, Wishlist
+from store.ratings import rebuild_rating_aggregates
+from store.recommendations import refresh as refresh_recommendations
+from store.reporting import rebuild_rollups
+from store.search import rebuild_index
+
+ADJECTIVES = 'classic slim organic vintage smart wireless compact deluxe eco premium travel everyday'.split()
+NOUNS = 'shirt tshirt laptop phone watch lamp mug bottle backpack headphones speaker jacket shoes desk chair'.split()
+COMMENTS = ['Great value.', 'Works as described.', 'Not bad for the price.', 'Would buy again!', 'Quality could be better.', 'Arrived quickly.']
+
+
+class Command(BaseCommand):
+    help = "Seed a reproducible synthetic store (users, catalog, reviews, wishlists, order history) with bulk inserts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--categories', type=int, default=12)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--reviews', type=int, default=10000)
+        parser.add_argument('--wishlists', type=int, default=2000)
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--days', type=int, default=365, help="Spread historical orders over this many days")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--prefix', default='seed', help="Tag for generated user emails, so runs don't collide")
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **o):
+        rng = random.Random(o['seed']); bs = o['batch_size']
+        with transaction.atomic():
+            password = make_password('password')  # hashed once, shared by every seeded user
+            users = User.objects.bulk_create([User(username=f"{o['prefix']}{i}", email=f"{o['prefix']}{i}@example.com", password=password,
+                                                   first_name=f'User{i}') for i in range(o['users'])], batch_size=bs)
+            categories = Category.objects.bulk_create([Category(name=f'{rng.choice(ADJECTIVES).title()} {noun.title()}s')
+                                                       for noun in rng.sample(NOUNS * 10, o['categories'])], batch_size=bs)
+            products = Product.objects.bulk_create([Product(
+                sku=f"{o['prefix']}-{i}", name=f'{rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS).title()} {i}',
+                price=rng.randint(99, 4999), stock=rng.randint(0, 500), category=rng.choice(categories),
+                description=' '.join(rng.choices(ADJECTIVES + NOUNS, k=25)),
+            ) for i in range(o['products'])], batch_size=bs)
+            self.stdout.write(f"{len(users)} users, {len(categories)} categories, {len(products)} products")
+
+            reviews = [Review(product=rng.choice(products), user=rng.choice(users), rating=rng.choices(range(1, 6), weights=(1, 1, 3, 6, 9))[0],
+                              comment=rng.choice(COMMENTS)) for _ in range(o['reviews'])]
+            Review.objects.bulk_create(reviews, batch_size=bs)
+            wishlists = {(rng.choice(users).pk, rng.choice(products).pk) for _ in range(o['wishlists'])}
+            Wishlist.objects.bulk_create([Wishlist(user_id=u, product_id=p) for u, p in wishlists], batch_size=bs, ignore_conflicts=True)
+            self.stdout.write(f"{len(reviews)} reviews, {len(wishlists)} wishlist entries")
+
+            now = timezone.now(); lines = 0
+            for offset in range(0, o['orders'], bs):  # one batch at a time, so a million order lines stay out of memory
+                orders = Order.objects.bulk_create([Order(user=rng.choice(users), complete=True, transaction_id=f"TXN-SEED-{o['seed']}-{i}")
+                                                    for i in range(offset, min(offset + bs, o['orders']))])
+                items = [OrderItem(order=order, product=product, quantity=rng.randint(1, 3), unit_price=product.price, product_name=product.name)
+                         for order in orders for product in rng.sample(products, min(len(products), rng.randint(1, 4)))]
+                OrderItem.objects.bulk_create(items, batch_size=bs)
+                for order in orders:
+                    order.date_ordered = order.completed_at = now - timedelta(days=rng.random() * o['days']); order.total = 0; order.item_count = 0
+                for item in items: item.order.total += item.get_total; item.order.item_count += item.quantity
+                Order.objects.bulk_update(orders, ['date_ordered', 'completed_at', 'total', 'item_count'])  # bulk_update bypasses auto_now_add
+                lines += len(items)
+            self.stdout.write(f"{o['orders']} completed orders with {lines} lines")
+
+            # bulk_create skips signals: rebuild what they would have maintained
+            rebuild_rating_aggregates(batch_size=bs)
+            rebuild_index()
+            rebuild_rollups(batch_size=bs)
+            refresh_recommendations(full=True)
+            transaction.on_commit(bump_catalog_version)
+        with connection.cursor() as cursor: cursor.execute('ANALYZE')  # fresh planner statistics for the new data
+        self.stdout.write(self.style.SUCCESS("Seeding complete."))
@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from store.outbox import drain_outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver queued OutboxEmail rows in batches, retrying failures with exponential backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=4, help="Sender threads; each reuses one connection per batch")
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting once the outbox is drained")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = drain_outbox(options['batch_size'], options['workers'], options['max_attempts'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(f"Outbox: {sent} sent, {failed} failed (will retry unless out of attempts).")
+            if not options['loop']: break
+            time.sleep(options['interval'])
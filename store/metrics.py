@@ -0,0 +1,60 @@
+import contextvars
+import time
+from collections import Counter
+
+# Metrics for the request being handled on this thread/task (None outside a request)
+current = contextvars.ContextVar('request_metrics', default=None)
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = Counter()  # (sql, params) -> executions
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.view_started = self.view_time = None
+
+    # connection.execute_wrapper hook
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try: return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries[(sql, repr(params))] += 1
+
+    @property
+    def query_count(self): return sum(self.queries.values())
+
+    @property
+    def duplicate_count(self):
+        # Identical statement and parameters executed more than once
+        return sum(n - 1 for n in self.queries.values() if n > 1)
+
+    def most_repeated(self):
+        # Same SQL with different parameters is the N+1 signature
+        by_sql = Counter()
+        for (sql, _), n in self.queries.items(): by_sql[sql] += n
+        return by_sql.most_common(1)[0] if by_sql else (None, 0)
+
+    def summary(self):
+        total = time.perf_counter() - self.started
+        sql, repeats = self.most_repeated()
+        return {
+            'total_ms': round(total * 1000, 2), 'view_ms': round((self.view_time or 0) * 1000, 2),
+            'db_ms': round(self.db_time * 1000, 2), 'queries': self.query_count, 'duplicates': self.duplicate_count,
+            'template_ms': round(self.template_time * 1000, 2), 'max_repeats': repeats, 'repeated_sql': sql if repeats > 1 else None,
+        }
+
+def track_queries(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection (store.signals): forwards to the current request's metrics.
+
+    Going through the contextvar rather than a per-request execute_wrapper means async views, whose queries run on
+    another thread's connection, are counted without hooking that connection per request.
+    """
+    metrics = current.get()
+    return metrics(execute, sql, params, many, context) if metrics else execute(sql, params, many, context)
+
+def server_timing(summary):
+    return ', '.join([
+        f'db;dur={summary["db_ms"]};desc="{summary["queries"]} queries, {summary["duplicates"]} dup"',
+        f'tpl;dur={summary["template_ms"]}', f'view;dur={summary["view_ms"]}', f'total;dur={summary["total_ms"]}',
+    ])
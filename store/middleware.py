@@ -0,0 +1,124 @@
+import logging
+import mimetypes
+import os
+import re
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from .metrics import RequestMetrics, current, server_timing
+
+logger = logging.getLogger('store.metrics')
+
+class RequestMetricsMiddleware:
+    """Per-request SQL count/time, duplicate queries, template and view time.
+
+    Emitted as a Server-Timing header (when SERVER_TIMING_HEADER is on) and one
+    `store.metrics` log line. Keep it last in MIDDLEWARE so "view" is just the view.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.repeat_warning = getattr(settings, 'QUERY_REPEAT_WARNING', 10)
+        if iscoroutinefunction(get_response): markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self): return self.__acall__(request)
+        metrics = RequestMetrics(); token = current.set(metrics)  # queries reach it via metrics.track_queries
+        try: response = self.get_response(request)
+        finally: current.reset(token)
+        return self.record(request, metrics, response)
+
+    async def __acall__(self, request):
+        # The context (and so `current`) follows the request into sync_to_async threads, where its queries run
+        metrics = RequestMetrics(); token = current.set(metrics)
+        try: response = await self.get_response(request)
+        finally: current.reset(token)
+        return self.record(request, metrics, response)
+
+    def record(self, request, metrics, response):
+        if metrics.view_started is not None: metrics.view_time = time.perf_counter() - metrics.view_started
+        summary = metrics.summary()
+        if getattr(settings, 'SERVER_TIMING_HEADER', settings.DEBUG): response['Server-Timing'] = server_timing(summary)
+        level = logging.WARNING if summary['max_repeats'] >= self.repeat_warning else logging.INFO
+        logger.log(level, "%s %s %s total=%sms view=%sms db=%sms queries=%s dup=%s tpl=%sms max_repeats=%s", request.method, request.path,
+                   response.status_code, summary['total_ms'], summary['view_ms'], summary['db_ms'], summary['queries'], summary['duplicates'],
+                   summary['template_ms'], summary['max_repeats'], extra={'metrics': {**summary, 'method': request.method, 'path': request.path, 'status': response.status_code}})
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = current.get()
+        if metrics: metrics.view_started = time.perf_counter()
+
+
+# ManifestStaticFilesStorage names: main.1a2b3c4d5e6f.css
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))  # preference order
+
+def accepted_encodings(header):
+    """Accept-Encoding -> {coding: q}; q=0 means "not acceptable"."""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        try: q = float(params.strip()[2:]) if params.strip().startswith('q=') else 1.0
+        except ValueError: q = 0.0
+        if coding: accepted[coding.strip().lower()] = q
+    return accepted
+
+class StaticFilesMiddleware:
+    """Serves collectstatic output (STATIC_ROOT) and uploads (MEDIA_ROOT) from the app process.
+
+    Picks the precompressed .br/.gz sibling the client accepts, answers conditional requests with 304,
+    and marks content-hashed files immutable for a year; anything else gets STATIC_REVALIDATE_MAX_AGE.
+    Put it right after SecurityMiddleware so asset requests skip sessions, auth and metrics.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.roots = [(url, root) for url, root in ((settings.STATIC_URL, settings.STATIC_ROOT), (settings.MEDIA_URL, settings.MEDIA_ROOT)) if url and root]
+        if iscoroutinefunction(get_response): markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self): return self.__acall__(request)
+        path = self.find(request)
+        return self.serve(request, path) if path else self.get_response(request)
+
+    async def __acall__(self, request):
+        # A stat() and an open(): cheap enough for the event loop; ASGI streams the file body from a thread
+        path = self.find(request)
+        return self.serve(request, path) if path else await self.get_response(request)
+
+    def find(self, request):
+        if request.method not in ('GET', 'HEAD'): return None
+        url_path = request.path_info
+        for url, root in self.roots:
+            prefix = '/' + url.strip('/') + '/'
+            if url_path.startswith(prefix):
+                try: path = safe_join(root, url_path[len(prefix):])
+                except SuspiciousFileOperation: return None
+                return path if os.path.isfile(path) else None
+        return None
+
+    def serve(self, request, path):
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        variants = [(coding, path + suffix) for coding, suffix in ENCODINGS if os.path.isfile(path + suffix)]
+        coding, served = next(((c, p) for c, p in variants if accepted.get(c, accepted.get('*', 0)) > 0), (None, path))
+        stat = os.stat(served)
+        etag = quote_etag(f'{int(stat.st_mtime):x}-{stat.st_size:x}' + (f'-{coding}' if coding else ''))
+        response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is None:
+            content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+            response = FileResponse(open(served, 'rb'), content_type=content_type)
+            response['Last-Modified'] = http_date(stat.st_mtime)
+            if coding: response['Content-Encoding'] = coding
+        response['ETag'] = etag
+        if variants: patch_vary_headers(response, ('Accept-Encoding',))
+        if HASHED_NAME.search(path): response['Cache-Control'] = f'public, max-age={settings.STATIC_MAX_AGE}, immutable'
+        else: response['Cache-Control'] = f'public, max-age={settings.STATIC_REVALIDATE_MAX_AGE}'
+        return response
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    # SQLite only: other backends use the LIKE fallback in store.search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS store_product_fts USING fts5(name, description, category, tokenize='unicode61 remove_diacritics 2')")
+    schema_editor.execute(
+        "INSERT INTO store_product_fts(rowid, name, description, category) "
+        "SELECT p.id, p.name, COALESCE(p.description, ''), COALESCE(c.name, '') "
+        "FROM store_product p LEFT JOIN store_category c ON c.id = p.category_id"
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS store_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:07
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_open_orders(apps, schema_editor):
+    # The unique partial index needs at most one open order per user: fold extra carts into the oldest
+    Order = apps.get_model('store', 'Order'); OrderItem = apps.get_model('store', 'OrderItem')
+    users = Order.objects.filter(complete=False, user__isnull=False).values('user').annotate(n=Count('id')).filter(n__gt=1)
+    for row in users:
+        keep, *extra = Order.objects.filter(user=row['user'], complete=False).order_by('id').values_list('id', flat=True)
+        OrderItem.objects.filter(order_id__in=extra).update(order_id=keep)
+        Order.objects.filter(id__in=extra).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(condition=models.Q(('complete', True)), fields=['user', 'date_ordered'], name='order_history_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['order', 'product'], name='store_order_order_i_ec571c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'price', 'id'], name='store_produ_categor_866c90_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', 'rating_avg', 'id'], name='store_produ_categor_037c8f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'created_at', 'id'], name='store_revie_product_9ecc4d_idx'),
+        ),
+        migrations.RunPython(merge_open_orders, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='order',
+            constraint=models.UniqueConstraint(condition=models.Q(('complete', False)), fields=('user',), name='one_open_order_per_user'),
+        ),
+    ]
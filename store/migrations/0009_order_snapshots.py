@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:08
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+BATCH = 1000
+
+
+def backfill_snapshots(apps, schema_editor):
+    # Past orders never stored their prices: current prices are the best available record
+    Order = apps.get_model('store', 'Order'); OrderItem = apps.get_model('store', 'OrderItem')
+    items = OrderItem.objects.filter(order__complete=True, product__isnull=False, unit_price__isnull=True).select_related('product')
+    batch = []
+    for item in items.iterator(chunk_size=BATCH):
+        item.unit_price = item.product.price; item.product_name = item.product.name; batch.append(item)
+        if len(batch) >= BATCH: OrderItem.objects.bulk_update(batch, ['unit_price', 'product_name']); batch = []
+    OrderItem.objects.bulk_update(batch, ['unit_price', 'product_name'])
+
+    totals = (OrderItem.objects.filter(order__complete=True, order__total__isnull=True, unit_price__isnull=False).order_by()
+              .values('order_id').annotate(total=Sum(F('quantity') * F('unit_price')), items=Sum('quantity')))
+    orders = [Order(pk=row['order_id'], total=row['total'] or 0, item_count=row['items'] or 0) for row in totals]
+    Order.objects.bulk_update(orders, ['total', 'item_count'], batch_size=BATCH)
+    Order.objects.filter(complete=True, total__isnull=True).update(total=0, item_count=0)  # completed but empty
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='total',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='unit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+        migrations.RunPython(backfill_snapshots, migrations.RunPython.noop),
+    ]
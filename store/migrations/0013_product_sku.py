@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:03
+
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+
+def backfill_skus(apps, schema_editor):
+    # One UPDATE: existing products get ZS-<id>, so a first export can be edited and imported back
+    Product = apps.get_model('store', 'Product')
+    Product.objects.filter(sku__isnull=True).update(sku=Concat(Value('ZS-'), Cast('id', CharField())))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(backfill_skus, migrations.RunPython.noop),
+    ]
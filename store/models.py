@@ -1,6 +1,8 @@
 from django.db import models
+from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
+from django.utils import timezone
 
 class User(AbstractUser):
     email = models.EmailField(unique=True)
@@ -15,9 +17,12 @@ class User(AbstractUser):
 class Category(models.Model):
     name = models.CharField(max_length=100)
     image = models.ImageField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     def __str__(self): return self.name
 
 class Product(models.Model):
+    # Stable key for bulk import/export (store.catalog_io); products saved without one get ZS-<id> (store.signals)
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     name = models.CharField(max_length=200)
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -25,6 +30,22 @@ class Product(models.Model):
     digital = models.BooleanField(default=False, null=True, blank=True)
     image = models.ImageField(null=True, blank=True)
     description = models.TextField(null=True, blank=True)
+    # Denormalized rating aggregates, maintained by store.ratings on Review writes
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_avg = models.FloatField(default=0)
+    rating_1 = models.IntegerField(default=0)
+    rating_2 = models.IntegerField(default=0)
+    rating_3 = models.IntegerField(default=0)
+    rating_4 = models.IntegerField(default=0)
+    rating_5 = models.IntegerField(default=0)
+    # Bumped by saves and by the bulk UPDATEs for reviews and stock (ratings.py, checkout.py): drives Last-Modified/ETag
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # Keyset pagination orderings (store.catalog.SORTS), globally and within a category
+        indexes = [models.Index(fields=['price', 'id']), models.Index(fields=['rating_avg', 'id']),
+                   models.Index(fields=['category', 'price', 'id']), models.Index(fields=['category', 'rating_avg', 'id'])]
 
     def __str__(self): return self.name
 
@@ -35,22 +56,29 @@ class Product(models.Model):
         return url
 
     @property
-    def average_rating(self):
-        reviews = self.review_set.all()
-        if reviews:
-            return sum([r.rating for r in reviews]) / len(reviews)
-        return 0
+    def available_stock(self):
+        # Stock minus other carts' active holds, when loaded through store.inventory.with_holds (else raw stock)
+        return max(self.stock - (getattr(self, 'held', None) or 0), 0)
+
+    @property
+    def average_rating(self): return self.rating_avg
+
+    @property
+    def review_count(self): return self.rating_count
 
     @property
-    def review_count(self):
-        return self.review_set.count()
+    def rating_histogram(self):
+        # [(stars, count, percent), ...] from 5 stars down to 1
+        total = self.rating_count or 1
+        return [(n, getattr(self, f'rating_{n}'), round(getattr(self, f'rating_{n}') * 100 / total)) for n in range(5, 0, -1)]
 
 class Review(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    rating = models.IntegerField(default=5)
+    rating = models.IntegerField(default=5, validators=[MinValueValidator(1), MaxValueValidator(5)])
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    class Meta: indexes = [models.Index(fields=['product', 'created_at', 'id'])] # newest reviews per product
     def __str__(self): return f"{self.user.email} - {self.product.name}"
 
 class Wishlist(models.Model):
@@ -64,13 +92,24 @@ class Order(models.Model):
     date_ordered = models.DateTimeField(auto_now_add=True)
     complete = models.BooleanField(default=False)
     transaction_id = models.CharField(max_length=100, null=True)
+    # Snapshot taken at checkout (store.checkout.complete_order); None while the order is still a cart
+    total = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    item_count = models.IntegerField(null=True, blank=True)
+    # The sales day (older orders fall back to date_ordered); also the watermark store.recommendations refreshes from
+    completed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    class Meta:
+        # Partial, because SQLite renders complete=True/False as a bare boolean term an index column can't match
+        indexes = [models.Index(fields=['user', 'date_ordered'], condition=models.Q(complete=True), name='order_history_idx')]
+        constraints = [models.UniqueConstraint(fields=['user'], condition=models.Q(complete=False), name='one_open_order_per_user')]
     def __str__(self): return str(self.id)
     @property
     def get_cart_total(self):
+        if self.total is not None: return self.total
         orderitems = self.orderitem_set.all()
         return sum([item.get_total for item in orderitems])
     @property
     def get_cart_items(self):
+        if self.item_count is not None: return self.item_count
         orderitems = self.orderitem_set.all()
         return sum([item.quantity for item in orderitems])
 
@@ -79,5 +118,88 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.SET_NULL, null=True)
     quantity = models.IntegerField(default=0, null=True, blank=True)
     date_added = models.DateTimeField(auto_now_add=True)
+    # Price and name at purchase time, so history survives repricing, renames and deleted products
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    product_name = models.CharField(max_length=200, blank=True)
+    class Meta: indexes = [models.Index(fields=['order', 'product'])]
     @property
-    def get_total(self): return self.product.price * self.quantity
\ No newline at end of file
+    def get_total(self): return (self.product.price if self.unit_price is None else self.unit_price) * self.quantity
+
+class Reservation(models.Model):
+    # Units an open cart holds until expires_at (store.inventory); expired rows are deleted by `manage.py expire_reservations`
+    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['order', 'product'], name='one_reservation_per_line')]
+        # (product, expires_at, quantity) answers "units held right now" from the index alone; expires_at drives the sweeper
+        indexes = [models.Index(fields=['product', 'expires_at', 'quantity'], name='reservation_active_idx'), models.Index(fields=['expires_at'])]
+
+# --- SALES ROLLUPS ---
+# Daily counters kept by store.reporting (incrementally at checkout, or rebuilt from history), so reports read
+# days x products rows instead of every order line. Rows go with their product/category; a rebuild refiles them.
+class SalesRollup(models.Model):
+    day = models.DateField()
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)
+    class Meta: abstract = True
+
+class DailySales(SalesRollup):
+    class Meta: constraints = [models.UniqueConstraint(fields=['day'], name='daily_sales_day')]
+
+class DailyProductSales(SalesRollup):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['day', 'product'], name='daily_product_sales_day')]
+        # Covers the top-products report: each product's days are one range, grouped without a temp b-tree or table lookups
+        indexes = [models.Index(fields=['product', 'day', 'units', 'revenue', 'orders'], name='daily_product_sales_cover')]
+
+class DailyCategorySales(SalesRollup):
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)  # None: uncategorized
+    class Meta:
+        # COALESCE so the uncategorized row is unique per day too (NULLs never conflict in a plain unique index)
+        constraints = [models.UniqueConstraint(models.F('day'), models.functions.Coalesce('category', models.Value(0)), name='daily_category_sales_day')]
+
+# --- FREQUENTLY BOUGHT TOGETHER ---
+# Built offline by store.recommendations (`manage.py refresh_recommendations`) from completed orders
+class CoPurchase(models.Model):
+    # Sparse co-purchase matrix: orders containing both products, stored in both directions
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', db_index=False)  # the unique pair leads with it
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+    class Meta: constraints = [models.UniqueConstraint(fields=['product', 'other'], name='co_purchase_pair')]
+
+class RelatedProduct(models.Model):
+    # Top-K of each product's CoPurchase row, so pages read it with one (product, rank) index range
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', db_index=False)  # (product, rank) serves it
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_to')
+    rank = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField()
+    class Meta: constraints = [models.UniqueConstraint(fields=['product', 'rank'], name='related_product_rank')]
+
+class RecommendationRefresh(models.Model):
+    # One row per refresh; the latest `through` is where the next incremental run starts
+    through = models.DateTimeField()
+    orders = models.IntegerField(default=0)
+    full = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class OutboxEmail(models.Model):
+    # Written in the same transaction as the business change; delivered by `manage.py send_outbox`
+    PENDING, SENDING, SENT, FAILED = 'pending', 'sending', 'sent', 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (SENDING, 'Sending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254, blank=True)
+    to = models.TextField(help_text="Comma separated recipients")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    class Meta: indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+    def __str__(self): return f"{self.subject} -> {self.to} ({self.status})"
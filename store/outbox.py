@@ -0,0 +1,72 @@
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection as db_connection
+from django.db.models import Q
+from django.utils import timezone
+from .models import OutboxEmail
+
+SEND_LEASE = timedelta(minutes=5)  # a crashed worker's claim becomes sendable again after this
+
+def enqueue_email(subject, body, to, from_email=None):
+    """Queue a message; call inside the transaction that makes it true so both commit (or neither)."""
+    if isinstance(to, str): to = [to]
+    return OutboxEmail.objects.create(subject=subject, body=body, to=','.join(to), from_email=from_email or settings.EMAIL_HOST_USER)
+
+def backoff(attempts, base=30, cap=3600):
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), cap))
+
+def claim_batch(batch_size):
+    now = timezone.now(); token = uuid.uuid4().hex
+    due = Q(status__in=[OutboxEmail.PENDING, OutboxEmail.SENDING], next_attempt_at__lte=now)
+    ids = list(OutboxEmail.objects.filter(due).order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+    if not ids: return []
+    # Conditional UPDATE: another worker that grabbed the same rows first wins them
+    OutboxEmail.objects.filter(due, pk__in=ids).update(status=OutboxEmail.SENDING, claim_token=token, next_attempt_at=now + SEND_LEASE)
+    return list(OutboxEmail.objects.filter(claim_token=token, status=OutboxEmail.SENDING))
+
+def send_batch(emails, max_attempts=5):
+    """Deliver a claimed batch over one reused backend connection. Returns (sent, failed)."""
+    sent, retry = [], []
+    connection = get_connection()
+    try: connection.open()
+    except Exception as e:
+        # Could not even connect: every message in the batch counts one failed attempt
+        connection = None; error = str(e)
+    for email in emails:
+        try:
+            if connection is None: raise ConnectionError(error)
+            EmailMessage(email.subject, email.body, email.from_email or None, email.to.split(','), connection=connection).send()
+            sent.append(email.pk)
+        except Exception as e:
+            email.attempts += 1; email.last_error = str(e)[:1000]
+            email.status = OutboxEmail.FAILED if email.attempts >= max_attempts else OutboxEmail.PENDING
+            email.next_attempt_at = timezone.now() + backoff(email.attempts)
+            retry.append(email)
+    if connection is not None: connection.close()
+    if sent: OutboxEmail.objects.filter(pk__in=sent).update(status=OutboxEmail.SENT, sent_at=timezone.now(), last_error='')
+    if retry: OutboxEmail.objects.bulk_update(retry, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+    return len(sent), len(retry)
+
+def _drain(batch_size, max_attempts):
+    sent = failed = 0
+    try:
+        while True:
+            batch = claim_batch(batch_size)
+            if not batch: return sent, failed
+            s, f = send_batch(batch, max_attempts); sent += s; failed += f
+    finally:
+        db_connection.close()
+
+def drain_outbox(batch_size=50, workers=1, max_attempts=5):
+    """Send everything that is due. With workers > 1 each thread claims its own batches and keeps one SMTP connection per batch."""
+    if workers <= 1:
+        sent = failed = 0
+        while batch := claim_batch(batch_size):
+            s, f = send_batch(batch, max_attempts); sent += s; failed += f
+        return sent, failed
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda _: _drain(batch_size, max_attempts), range(workers)))
+    return sum(r[0] for r in results), sum(r[1] for r in results)
@@ -0,0 +1,34 @@
+from django.db.models import F, Q, Case, When, Value, Count, Sum, FloatField
+from django.db.models.functions import Cast, Now
+from django.utils import timezone
+from .models import Product, Review
+
+STARS = range(1, 6)
+
+def apply_rating_delta(product_id, rating, sign):
+    """Add (sign=1) or remove (sign=-1) one review's rating from the product aggregates in a single UPDATE."""
+    rating = int(rating)
+    new_avg = Cast(F('rating_sum') + sign * rating, FloatField()) / (F('rating_count') + sign)
+    if sign < 0: new_avg = Case(When(rating_count__lte=1, then=Value(0.0)), default=new_avg)
+    fields = {'rating_count': F('rating_count') + sign, 'rating_sum': F('rating_sum') + sign * rating, 'rating_avg': new_avg,
+              'updated_at': Now()}  # update() skips auto_now
+    if rating in STARS: fields[f'rating_{rating}'] = F(f'rating_{rating}') + sign
+    Product.objects.filter(pk=product_id).update(**fields)
+
+def rebuild_rating_aggregates(batch_size=500):
+    """Recompute every product's aggregates from the Review table. Returns the number of products updated."""
+    stats = {row['product_id']: row for row in Review.objects.order_by().values('product_id').annotate(
+        count=Count('id'), total=Sum('rating'), **{f'r{n}': Count('id', filter=Q(rating=n)) for n in STARS})}
+    fields = ['rating_count', 'rating_sum', 'rating_avg', 'updated_at'] + [f'rating_{n}' for n in STARS]
+    batch = []; updated = 0; now = timezone.now()
+    for product in Product.objects.only('id').iterator(chunk_size=batch_size):
+        row = stats.get(product.id)
+        product.rating_count = row['count'] if row else 0
+        product.rating_sum = row['total'] if row else 0
+        product.rating_avg = product.rating_sum / product.rating_count if product.rating_count else 0
+        for n in STARS: setattr(product, f'rating_{n}', row[f'r{n}'] if row else 0)
+        product.updated_at = now; batch.append(product)
+        if len(batch) >= batch_size:
+            Product.objects.bulk_update(batch, fields); updated += len(batch); batch = []
+    if batch: Product.objects.bulk_update(batch, fields); updated += len(batch)
+    return updated
@@ -0,0 +1,125 @@
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import permutations
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from .counters import add_counts
+from .inventory import held_subquery, with_holds
+from .models import CoPurchase, Order, OrderItem, Product, RecommendationRefresh, RelatedProduct
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # optional: pairs are counted in pure Python instead
+    np = sparse = None
+
+# "Frequently bought together". CoPurchase is the sparse co-purchase matrix (completed orders containing both
+# products), RelatedProduct each product's top K of it. `manage.py refresh_recommendations` adds the orders
+# completed since the last run, or rebuilds from scratch with --full; pages only ever read RelatedProduct.
+
+TOP_K = 10
+VERSION_KEY = 'recommendations:version'
+SETTLE = timedelta(seconds=60)  # checkouts stamp completed_at before committing: leave the last minute to the next run
+
+def recommendations_version():
+    # Part of the product page ETag, so a refresh revalidates cached detail pages
+    return cache.get(VERSION_KEY) or 0
+
+def bump_recommendations_version():
+    cache.set(VERSION_KEY, int(time.time() * 1000), None)
+
+# --- BUILDING ---
+def count_pairs(lines):
+    """{(product, other): orders containing both} from (order_id, product_id) lines; both directions, no diagonal."""
+    if not lines: return {}
+    if sparse is not None:
+        orders, products = np.asarray(lines, dtype=np.int64).T
+        _, rows = np.unique(orders, return_inverse=True)
+        ids, cols = np.unique(products, return_inverse=True)
+        # Order x product incidence (duplicate lines summed, then clamped to 1): basket.T @ basket counts shared orders
+        basket = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(rows.max() + 1, len(ids)))
+        basket.data[:] = 1
+        pairs = (basket.T @ basket).tocoo()
+        off = pairs.row != pairs.col
+        return dict(zip(zip(ids[pairs.row[off]].tolist(), ids[pairs.col[off]].tolist()), pairs.data[off].tolist()))
+    baskets = defaultdict(set)
+    for order, product in lines: baskets[order].add(product)
+    return Counter(pair for products in baskets.values() for pair in permutations(products, 2))
+
+def _baskets(orders, chunk_orders):
+    # (order_id, product_id) lines of `orders`, streamed and cut into lists of whole orders
+    lines = (OrderItem.objects.filter(order__in=orders, product__isnull=False, quantity__gt=0)
+             .order_by('order_id').values_list('order_id', 'product_id'))
+    chunk, count, last = [], 0, None
+    for order_id, product_id in lines.iterator(chunk_size=5000):
+        if order_id != last:
+            if count >= chunk_orders: yield chunk, count; chunk, count = [], 0
+            count += 1; last = order_id
+        chunk.append((order_id, product_id))
+    if chunk: yield chunk, count
+
+def _add(lines):
+    # Adds one chunk to the matrix; returns the products whose row changed
+    pairs = count_pairs(lines)
+    add_counts(CoPurchase, ['product_id', 'other_id'], ['count'], {pair: (n,) for pair, n in pairs.items()})
+    return {product for product, _ in pairs}
+
+def rank(product_ids, top_k=TOP_K, batch_size=500):
+    """Rewrite RelatedProduct for the products: their top_k CoPurchase entries, via ROW_NUMBER() per product."""
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), batch_size):
+        ids = product_ids[start:start + batch_size]
+        top = CoPurchase.objects.filter(product__in=ids).annotate(
+            rank=Window(RowNumber(), partition_by=F('product'), order_by=(F('count').desc(), F('other').asc()))).filter(rank__lte=top_k)
+        rows = [RelatedProduct(product_id=p, related_id=o, count=n, rank=r) for p, o, n, r in top.values_list('product', 'other', 'count', 'rank')]
+        with transaction.atomic():
+            RelatedProduct.objects.filter(product__in=ids).delete()
+            RelatedProduct.objects.bulk_create(rows)
+
+def refresh(full=False, top_k=TOP_K, chunk_orders=20000):
+    """
+    Fold the orders completed since the last refresh into CoPurchase and re-rank the products they touched, in
+    one transaction. With full=True (or no previous run), start over from every completed order: chunk by chunk,
+    with the run log cleared first so an interrupted rebuild is simply redone. Returns (orders, products re-ranked).
+    """
+    through = timezone.now() - SETTLE
+    last = None if full else RecommendationRefresh.objects.order_by('-through').values_list('through', flat=True).first()
+    if last is None:
+        orders = Order.objects.filter(Q(completed_at__lte=through) | Q(completed_at__isnull=True), complete=True)  # older orders have none
+        with transaction.atomic(): RecommendationRefresh.objects.all().delete(); CoPurchase.objects.all().delete()
+        touched, total = set(), 0
+        for lines, count in _baskets(orders, chunk_orders):
+            with transaction.atomic(): touched |= _add(lines)
+            total += count
+        rank(touched, top_k)
+        RelatedProduct.objects.exclude(product__in=touched).delete()
+    else:
+        orders = Order.objects.filter(complete=True, completed_at__gt=last, completed_at__lte=through)
+        with transaction.atomic():
+            touched, total = set(), 0
+            for lines, count in _baskets(orders, chunk_orders): touched |= _add(lines); total += count
+            rank(touched, top_k)
+    RecommendationRefresh.objects.create(through=through, orders=total, full=last is None)
+    if touched: bump_recommendations_version()
+    return total, len(touched)
+
+# --- SERVING ---
+def related_products(product_id, limit=4):
+    """The product's most co-purchased products: one (product, rank) index range joined to Product."""
+    return list(with_holds(Product.objects.filter(related_to__product=product_id)).order_by('related_to__rank')[:limit])
+
+def cart_recommendations(product_ids, limit=4):
+    """
+    Products bought most often with any of the cart's products and not already in it. One read of at most
+    len(product_ids) x TOP_K RelatedProduct rows (index order, no sort), summed here rather than by a SQL GROUP BY.
+    """
+    if not product_ids: return []
+    rows = (RelatedProduct.objects.filter(product__in=product_ids).exclude(related__in=product_ids)
+            .select_related('related').annotate(held=held_subquery(product_ref='related')))
+    together, products = Counter(), {}
+    for row in rows:
+        together[row.related_id] += row.count; products[row.related_id] = row.related; row.related.held = row.held
+    return [products[pk] for pk, _ in sorted(together.items(), key=lambda item: (-item[1], item[0]))[:limit]]
@@ -0,0 +1,73 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from .counters import add_counts
+from .models import Category, DailyCategorySales, DailyProductSales, DailySales, OrderItem, Product
+
+# Sales reports read the daily rollups (store.models SALES ROLLUPS), never the order lines: checkout adds each
+# order to them, `manage.py rebuild_sales_rollups` recomputes them from history.
+
+COUNTERS = ('units', 'revenue', 'orders')
+
+def record_order(items, day):
+    """Add one completed order's lines (with `product` loaded) to the day's rollups: three statements, call inside checkout's transaction."""
+    products = defaultdict(lambda: [0, Decimal(0)]); categories = defaultdict(lambda: [0, Decimal(0)])
+    for item in items:
+        revenue = item.unit_price * item.quantity
+        for bucket in (products[item.product_id], categories[item.product.category_id]):
+            bucket[0] += item.quantity; bucket[1] += revenue
+    if not products: return
+    ops = connection.ops; day = ops.adapt_datefield_value(day)
+    counters = lambda units, revenue: (units, ops.adapt_decimalfield_value(revenue, 14, 2), 1)
+    qn = ops.quote_name; units = sum(u for u, _ in products.values()); revenue = sum((r for _, r in products.values()), Decimal(0))
+    add_counts(DailySales, ['day'], COUNTERS, {(day,): counters(units, revenue)})
+    add_counts(DailyProductSales, ['day', 'product_id'], COUNTERS, {(day, pid): counters(*sums) for pid, sums in products.items()})
+    # Matches the daily_category_sales_day expression index, so uncategorized lines share one row per day
+    add_counts(DailyCategorySales, ['day', 'category_id'], COUNTERS, {(day, cid): counters(*sums) for cid, sums in categories.items()},
+               conflict=f"{qn('day')}, (COALESCE({qn('category_id')}, 0))")
+
+def rebuild_rollups(since=None, batch_size=2000):
+    """
+    Recompute the rollups from completed orders, from `since` (a date) or for all history. Lines whose product
+    was deleted still count towards the daily totals, filed as uncategorized. Returns rows written per table.
+    """
+    lines = OrderItem.objects.filter(order__complete=True, quantity__gt=0).annotate(
+        day=TruncDate(Coalesce('order__completed_at', 'order__date_ordered'))).order_by()
+    if since: lines = lines.filter(day__gte=since)
+    sums = {'units': Sum('quantity'), 'orders': Count('order', distinct=True),
+            'revenue': Sum(F('quantity') * Coalesce('unit_price', 'product__price'), output_field=DecimalField(max_digits=14, decimal_places=2))}
+    plans = [(DailySales, lines.values('day')), (DailyProductSales, lines.filter(product__isnull=False).values('day', 'product_id')),
+             (DailyCategorySales, lines.values('day', category_id=F('product__category_id')))]
+    written = {}
+    with transaction.atomic():
+        for model, groups in plans:
+            stale = model.objects.all()
+            (stale.filter(day__gte=since) if since else stale).delete()
+            batch = []; written[model.__name__] = 0
+            for row in groups.annotate(**sums).iterator(chunk_size=batch_size):
+                row['revenue'] = row['revenue'] or 0; batch.append(model(**row))
+                if len(batch) >= batch_size:
+                    model.objects.bulk_create(batch); written[model.__name__] += len(batch); batch = []
+            if batch: model.objects.bulk_create(batch); written[model.__name__] += len(batch)
+    return written
+
+def _totals(queryset, key, named, limit=None):
+    # Counters summed per `key`, largest revenue first, then one lookup for the names: grouping by the id alone keeps
+    # to the covering index order. Renamed back afterwards since annotations can't reuse the field names
+    rows = list(queryset.values(key).annotate(**{f'total_{c}': Sum(c) for c in COUNTERS}).order_by('-total_revenue')[:limit])
+    names = dict(named.objects.filter(pk__in=[row[key] for row in rows]).values_list('pk', 'name'))
+    return [{key: row[key], 'name': names.get(row[key]), **{c: row[f'total_{c}'] for c in COUNTERS}} for row in rows]
+
+def sales_report(start, end, top=20):
+    """
+    Daily totals, per-category totals and the `top` products by revenue for the days start..end (inclusive).
+    Five queries over rollup rows (days x categories/products) and names, so cost doesn't grow with the number of orders.
+    """
+    days = Q(day__gte=start, day__lte=end)
+    daily = list(DailySales.objects.filter(days).order_by('day').values('day', *COUNTERS))
+    return {'start': start, 'end': end, 'daily': daily,
+            'totals': {c: sum((row[c] for row in daily), Decimal(0) if c == 'revenue' else 0) for c in COUNTERS},
+            'categories': _totals(DailyCategorySales.objects.filter(days), 'category_id', Category),
+            'products': _totals(DailyProductSales.objects.filter(days), 'product_id', Product, top)}
@@ -0,0 +1,28 @@
+from django.core import signing
+from .catalog import _after
+from .models import Order, Review
+
+REVIEW_PAGE_SIZE = 10
+REVIEW_ORDERING = ('-created_at', '-id')
+
+def encode_cursor(review):
+    return signing.dumps([review.created_at.isoformat(), review.pk], salt='review-cursor')
+
+def decode_cursor(cursor):
+    try: created_at, pk = signing.loads(cursor, salt='review-cursor')
+    except (signing.BadSignature, ValueError, TypeError): return None
+    return [Review._meta.get_field('created_at').to_python(created_at), pk]
+
+def review_page(product_id, cursor=None, size=REVIEW_PAGE_SIZE):
+    """Newest-first keyset page of a product's reviews with their authors: (reviews, next_cursor). One query."""
+    reviews = Review.objects.filter(product_id=product_id).select_related('user').order_by(*REVIEW_ORDERING)
+    values = decode_cursor(cursor) if cursor else None
+    if values: reviews = reviews.filter(_after(REVIEW_ORDERING, values))
+    items = list(reviews[:size + 1])
+    return items[:size], (encode_cursor(items[size - 1]) if len(items) > size else None)
+
+def verified_reviewers(product_id, reviews):
+    """Ids of the page's reviewers who bought the product (one query); the same for every visitor."""
+    user_ids = {r.user_id for r in reviews}
+    if not user_ids: return set()
+    return set(Order.objects.filter(complete=True, orderitem__product_id=product_id, user_id__in=user_ids).values_list('user_id', flat=True))
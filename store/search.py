@@ -0,0 +1,86 @@
+import re
+from django.db import connection
+from django.db.models import Q, Case, When, Value, IntegerField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'store_product_fts'
+# bm25() column weights: name, description, category name
+BM25_WEIGHTS = (10.0, 1.0, 5.0)
+
+def use_fts():
+    return connection.vendor == 'sqlite'
+
+def terms(query):
+    return re.findall(r'\w+', query or '')[:10]
+
+def fts_query(query):
+    # Every term is quoted (no FTS syntax injection) and prefix-matched, ANDed together
+    return ' '.join(f'"{t}"*' for t in terms(query))
+
+# --- INDEX MAINTENANCE ---
+INDEX_SELECT = (f"INSERT INTO {FTS_TABLE}(rowid, name, description, category) "
+                "SELECT p.id, p.name, COALESCE(p.description, ''), COALESCE(c.name, '') "
+                "FROM store_product p LEFT JOIN store_category c ON c.id = p.category_id")
+
+def index_products(product_ids=None, category_id=None):
+    """Re-index the given products (or every product of a category) with two statements."""
+    if not use_fts(): return
+    if category_id is not None:
+        where, params = "p.category_id = %s", [category_id]
+        delete = (f"DELETE FROM {FTS_TABLE} WHERE rowid IN (SELECT id FROM store_product WHERE category_id = %s)", params)
+    else:
+        product_ids = list(product_ids)
+        if not product_ids: return
+        marks = ', '.join(['%s'] * len(product_ids))
+        where, params = f"p.id IN ({marks})", product_ids
+        delete = (f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({marks})", params)
+    with connection.cursor() as cursor:
+        cursor.execute(*delete)
+        cursor.execute(f"{INDEX_SELECT} WHERE {where}", params)
+
+def remove_products(product_ids):
+    product_ids = list(product_ids)
+    if not use_fts() or not product_ids: return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(product_ids))})", product_ids)
+
+def rebuild_index():
+    if not use_fts(): return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(INDEX_SELECT)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}")
+        return cursor.fetchone()[0]
+
+# --- QUERIES ---
+def _like_filter(query):
+    q = Q()
+    for t in terms(query): q &= Q(name__icontains=t) | Q(description__icontains=t) | Q(category__name__icontains=t)
+    return q
+
+def filter_matching(products, query):
+    """Restrict a Product queryset to search matches (keeps it composable with the catalog filters)."""
+    if not terms(query): return products.none()
+    if use_fts(): return products.filter(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", (fts_query(query),)))
+    return products.filter(_like_filter(query))
+
+def ranked(products, query, offset, limit):
+    """Products matching `query` within the filtered queryset, best match first (BM25 on SQLite)."""
+    if not terms(query): return []
+    if not use_fts(): return ranked_like(products, query, offset, limit)
+    inner_sql, inner_params = products.order_by().values('id').query.sql_with_params()
+    weights = ', '.join(map(str, BM25_WEIGHTS))
+    with connection.cursor() as cursor:
+        # "+rowid" keeps the filter out of the FTS index plan; a bare rowid IN (...) makes SQLite run one MATCH per product
+        cursor.execute(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND +rowid IN ({inner_sql}) "
+                       f"ORDER BY bm25({FTS_TABLE}, {weights}), rowid LIMIT %s OFFSET %s", [fts_query(query), *inner_params, limit, offset])
+        ids = [row[0] for row in cursor.fetchall()]
+    found = products.order_by().in_bulk(ids)  # keeps the caller's annotations
+    return [found[i] for i in ids if i in found]
+
+def ranked_like(products, query, offset, limit):
+    # Fallback ranking: name matches before description/category matches, newest first
+    first_term = terms(query)[0]
+    return list(products.filter(_like_filter(query)).annotate(rank=Case(
+        When(name__icontains=first_term, then=Value(0)), default=Value(1), output_field=IntegerField())).order_by('rank', '-id')[offset:offset + limit])
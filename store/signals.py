@@ -0,0 +1,113 @@
+import logging
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.conf import settings
+from .models import Review, Order, OrderItem, Product, Category
+from .ratings import apply_rating_delta
+from .cart import invalidate_cart
+from .search import index_products, remove_products
+from .listing_cache import bump_catalog_version
+from .images import IMAGE_ERRORS, generate_derivatives
+from .metrics import track_queries
+
+logger = logging.getLogger(__name__)
+
+# --- RATING AGGREGATES ---
+@receiver(pre_save, sender=Review)
+def remember_old_rating(sender, instance, **kwargs):
+    # Edits (e.g. from the admin) need the previous values to undo them
+    instance._old_rating = None
+    if instance.pk and not instance._state.adding:
+        instance._old_rating = Review.objects.filter(pk=instance.pk).values_list('product_id', 'rating').first()
+
+@receiver(post_save, sender=Review)
+def review_saved(sender, instance, created, **kwargs):
+    old = getattr(instance, '_old_rating', None)
+    if not created and old == (instance.product_id, int(instance.rating)): return
+    if old: apply_rating_delta(old[0], old[1], -1)
+    apply_rating_delta(instance.product_id, instance.rating, 1)
+
+@receiver(post_delete, sender=Review)
+def review_deleted(sender, instance, **kwargs):
+    apply_rating_delta(instance.product_id, instance.rating, -1)
+
+# --- CART BADGE CACHE ---
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def order_changed(sender, instance, **kwargs):
+    invalidate_cart(instance.user_id)
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def order_item_changed(sender, instance, **kwargs):
+    if instance.order_id: invalidate_cart(instance.order.user_id)
+
+
+# --- SEARCH INDEX (FTS5) ---
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    index_products([instance.pk])
+
+# --- SKUS ---
+@receiver(post_save, sender=Product)
+def assign_sku(sender, instance, **kwargs):
+    # Products saved without one (admin, Product.objects.create) get ZS-<id> like migration 0013's backfill,
+    # so every product exports with the key import_catalog requires
+    if not instance.sku:
+        instance.sku = f'ZS-{instance.pk}'; Product.objects.filter(pk=instance.pk).update(sku=instance.sku)
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    remove_products([instance.pk])
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    if not created: index_products(category_id=instance.pk)
+
+@receiver(pre_delete, sender=Category)
+def category_deleting(sender, instance, **kwargs):
+    # Products are SET_NULL before post_delete fires, so remember them now
+    instance._product_ids = list(instance.product_set.values_list('id', flat=True))
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    index_products(getattr(instance, '_product_ids', []))
+
+
+# --- LISTING CACHE VERSION ---
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+# --- IMAGE DERIVATIVES ---
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def image_saved(sender, instance, **kwargs):
+    # New uploads get a new file name, so "no derivatives yet" means "just uploaded"
+    if instance.image:
+        try: generate_derivatives(instance.image.name)
+        except IMAGE_ERRORS: logger.exception("Image derivatives failed for %s", instance.image.name)  # the original is still served
+
+
+# --- REQUEST METRICS ---
+@receiver(connection_created)
+def attach_query_metrics(sender, connection, **kwargs):
+    # Before configure_sqlite, so a request that opens a connection is charged for its PRAGMAs
+    if track_queries not in connection.execute_wrappers: connection.execute_wrappers.append(track_queries)
+
+
+# --- SQLITE PRAGMAS ---
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    # Per-connection tuning from settings.SQLITE_PRAGMAS (set by the production profile)
+    if connection.vendor != 'sqlite': return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
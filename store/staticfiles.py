@@ -0,0 +1,36 @@
+import gzip
+import os
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz siblings are written
+    brotli = None
+
+# Text formats worth compressing; images and fonts are already compressed
+COMPRESSIBLE = ('.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.xml', '.html')
+MIN_SIZE = 512  # below this the headers outweigh the savings
+
+def compress_file(path):
+    """Write precompressed .gz (and .br when brotli is installed) siblings of one file, if they are smaller."""
+    with open(path, 'rb') as f: data = f.read()
+    written = []
+    encoders = [('.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli: encoders.append(('.br', lambda d: brotli.compress(d, quality=11)))
+    for suffix, encode in encoders:
+        compressed = encode(data)
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as f: f.write(compressed)
+            written.append(path + suffix)
+    return written
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """collectstatic output with content-hashed names (cacheable forever) plus .gz/.br siblings of the text files.
+
+    Served by store.middleware.StaticFilesMiddleware, which picks the sibling matching Accept-Encoding.
+    """
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run: return
+        for name in set(self.hashed_files.values()):
+            path = self.path(name)
+            if name.endswith(COMPRESSIBLE) and os.path.getsize(path) >= MIN_SIZE: compress_file(path)
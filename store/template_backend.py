@@ -0,0 +1,22 @@
+import time
+from django.template.backends.django import DjangoTemplates, Template
+from .metrics import current
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = current.get()
+        if metrics is None: return super().render(context, request)
+        start = time.perf_counter()
+        try: return super().render(context, request)
+        finally: metrics.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The stock Django backend, plus render time recorded into the request metrics."""
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,35 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+from ..images import SIZES, derivative_name, has_derivatives
+
+register = template.Library()
+
+# Rendered width of each use, for the `sizes` attribute
+DISPLAY_SIZES = {'thumb': '60px', 'card': '(max-width: 480px) 45vw, 220px', 'detail': '(max-width: 768px) 90vw, 400px'}
+
+def _image_name(obj):
+    image = getattr(obj, 'image', None)
+    return image.name if image else ''
+
+def _srcset(name, ext, up_to):
+    return ', '.join(f'{default_storage.url(derivative_name(name, size, ext))} {width}w' for size, width in SIZES.items() if width <= SIZES[up_to] * 2)
+
+@register.simple_tag
+def responsive_image(obj, size='card', css_class='', style=''):
+    """<picture> with WebP and JPEG srcsets for a Product/Category image; falls back to the original upload."""
+    name = _image_name(obj)
+    attrs = format_html_join(' ', '{}="{}"', [(k, v) for k, v in (('class', css_class), ('style', style)) if v])
+    if not name or not has_derivatives(name):
+        return format_html('<img src="{}" {} loading="lazy">', getattr(obj, 'imageURL', ''), attrs)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}"><img src="{}" srcset="{}" sizes="{}" {} loading="lazy"></picture>',
+        _srcset(name, 'webp', size), DISPLAY_SIZES[size], default_storage.url(derivative_name(name, size, 'jpg')),
+        _srcset(name, 'jpg', size), DISPLAY_SIZES[size], attrs)
+
+@register.simple_tag
+def image_url(obj, size='card'):
+    # Single URL for CSS backgrounds
+    name = _image_name(obj)
+    if name and has_derivatives(name): return default_storage.url(derivative_name(name, size, 'jpg'))
+    return obj.image.url if name else ''
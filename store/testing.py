@@ -0,0 +1,18 @@
+from contextlib import contextmanager
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+@contextmanager
+def query_budget(max_queries, using='default'):
+    """Fail if the block runs more than `max_queries` SQL statements (an upper bound, unlike assertNumQueries)."""
+    with CaptureQueriesContext(connections[using]) as captured:
+        yield captured
+    if len(captured) > max_queries:
+        listing = '\n'.join(f"{i}. {q['sql']}" for i, q in enumerate(captured.captured_queries, 1))
+        raise AssertionError(f"{len(captured)} queries executed, budget is {max_queries}:\n{listing}")
+
+
+class QueryBudgetMixin:
+    def assertQueryBudget(self, max_queries, using='default'):
+        return query_budget(max_queries, using)
@@ -1,3 +1,1099 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gzip
+import json
+import os
+import runpy
+import shutil
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Now
+from django.http import JsonResponse
+from django.template import Context, Template
+from django.templatetags.static import static
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+
+from . import async_views, recommendations, staticfiles, views
+from .benchmark import percentile, run_async_scenario
+from .cart import CartError, cart_cache_key, update_line
+from .catalog import SORTS, get_filters, paginate
+from .catalog_io import export_rows, render_rows
+from .checkout import OutOfStock, complete_order
+from .facets import compute_facets
+from .inventory import available_stock
+from .listing_cache import catalog_last_modified, catalog_version
+from .middleware import accepted_encodings
+from .models import *
+from .outbox import drain_outbox, enqueue_email
+from .ratings import rebuild_rating_aggregates
+from .reviews import review_page
+from .search import rebuild_index
+from .signals import configure_sqlite
+from .testing import QueryBudgetMixin
+from .urls import hot
+from .views import get_cart_count
+
+def make_user(email='buyer@example.com', **extra):
+    return User.objects.create_user(username=email.split('@')[0], email=email, password='pass12345', **extra)
+
+def scratch_dir(case):
+    # Temporary directory removed with the test, or with the class when `case` is a test class
+    path = tempfile.mkdtemp()
+    (case.addClassCleanup if isinstance(case, type) else case.addCleanup)(shutil.rmtree, path, ignore_errors=True)
+    return path
+
+class ScratchMediaMixin:
+    # MEDIA_ROOT in a scratch directory, created only when the class runs
+    @classmethod
+    def setUpClass(cls):
+        cls.enterClassContext(override_settings(MEDIA_ROOT=scratch_dir(cls)))
+        super().setUpClass()
+
+
+class RatingAggregateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Lamp', price=100)
+        self.alice = make_user('alice@example.com'); self.bob = make_user('bob@example.com')
+
+    def test_create_edit_delete_keep_aggregates_in_sync(self):
+        r1 = Review.objects.create(product=self.product, user=self.alice, rating=5, comment='great')
+        Review.objects.create(product=self.product, user=self.bob, rating=2, comment='meh')
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_count, self.product.rating_sum, self.product.rating_5, self.product.rating_2), (2, 7, 1, 1))
+        self.assertAlmostEqual(self.product.rating_avg, 3.5)
+        r1.rating = 4; r1.save()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_sum, self.product.rating_5, self.product.rating_4), (6, 0, 1))
+        Review.objects.all().delete()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_count, self.product.rating_sum, self.product.rating_avg), (0, 0, 0))
+
+    def test_rebuild_matches_reviews(self):
+        Review.objects.bulk_create([Review(product=self.product, user=self.alice, rating=3, comment='x'), Review(product=self.product, user=self.bob, rating=4, comment='y')])
+        rebuild_rating_aggregates()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.rating_count, self.product.rating_3, self.product.rating_4), (2, 1, 1))
+        self.assertAlmostEqual(self.product.rating_avg, 3.5)
+
+    def test_listing_query_count_is_independent_of_catalog_size(self):
+        Product.objects.bulk_create([Product(name=f'P{i}', price=10 + i) for i in range(30)])
+        with self.assertNumQueries(1):
+            self.client.get(reverse('products_partial'), {'rating': '0'})
+
+
+class CartBadgeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user(); self.client.force_login(self.user)
+        self.product = Product.objects.create(name='Mug', price=250, stock=5)
+
+    def add(self, quantity=1):
+        return self.client.post(reverse('update_item'), json.dumps({'productId': self.product.id, 'action': 'add', 'quantity': quantity}), content_type='application/json')
+
+    def test_browsing_does_not_create_an_order(self):
+        self.client.get(reverse('products')); self.client.get(reverse('cart'))
+        self.assertFalse(Order.objects.exists())
+
+    def test_badge_served_from_cache_after_cart_write(self):
+        self.assertEqual(self.add(2).json()['cartTotal'], 2)
+        request = SimpleNamespace(user=self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cart_count(request)['cartItems'], 2)
+        self.assertEqual(cache.get(cart_cache_key(self.user.pk)), {'items': 2})  # no amounts to go stale on repricing
+        OrderItem.objects.get().delete()
+        self.assertEqual(get_cart_count(request)['cartItems'], 0)
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = make_user()
+        self.mug = Product.objects.create(name='Mug', price=250, stock=5)
+        self.pen = Product.objects.create(name='Pen', price=20, stock=1)
+        self.order = Order.objects.create(user=self.user)
+
+    def test_completes_order_and_decrements_stock(self):
+        OrderItem.objects.create(order=self.order, product=self.mug, quantity=3)
+        complete_order(self.order, 'TXN-1')
+        self.mug.refresh_from_db(); self.order.refresh_from_db()
+        self.assertEqual(self.mug.stock, 2); self.assertTrue(self.order.complete)
+
+    def test_short_line_rolls_back_whole_order(self):
+        OrderItem.objects.create(order=self.order, product=self.mug, quantity=3)
+        OrderItem.objects.create(order=self.order, product=self.pen, quantity=2)
+        with self.assertRaisesMessage(OutOfStock, 'Pen'):
+            complete_order(self.order, 'TXN-2')
+        self.mug.refresh_from_db(); self.order.refresh_from_db()
+        self.assertEqual(self.mug.stock, 5); self.assertFalse(self.order.complete)
+        self.assertIsNone(self.order.total)
+
+    def test_snapshots_prices_and_totals(self):
+        OrderItem.objects.create(order=self.order, product=self.mug, quantity=2)
+        OrderItem.objects.create(order=self.order, product=self.pen, quantity=1)
+        complete_order(self.order, 'TXN-3')
+        self.assertEqual((self.order.total, self.order.item_count), (520, 3))  # instance updated in place
+        Product.objects.filter(pk=self.mug.pk).update(price=999, name='Renamed')
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual((order.get_cart_total, order.get_cart_items), (520, 3))
+        self.assertEqual(sorted(order.orderitem_set.values_list('product_name', 'unit_price')), [('Mug', 250), ('Pen', 20)])
+
+    def test_profile_history_is_one_query(self):
+        self.order.delete()
+        for i in range(5):
+            order = Order.objects.create(user=self.user)
+            OrderItem.objects.create(order=order, product=self.mug, quantity=1)
+            complete_order(order, f'TXN-H{i}'); Product.objects.filter(pk=self.mug.pk).update(stock=5)
+        self.client.force_login(self.user)
+        get_cart_count(SimpleNamespace(user=self.user))  # warm the badge cache
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('profile'))
+        self.assertContains(response, '₹250', count=5)
+        self.assertEqual([q['sql'] for q in captured.captured_queries if 'store_product' in q['sql']], [])
+        self.assertEqual(len([q for q in captured.captured_queries if 'store_order' in q['sql']]), 1)
+
+    def test_backfill_migration(self):
+        done = Order.objects.create(user=self.user, complete=True)
+        OrderItem.objects.create(order=done, product=self.mug, quantity=2)
+        Order.objects.create(user=make_user('empty@example.com'), complete=True)
+        import_module('store.migrations.0009_order_snapshots').backfill_snapshots(django_apps, None)
+        done.refresh_from_db()
+        self.assertEqual((done.total, done.item_count), (500, 2))
+        self.assertEqual(done.orderitem_set.get().product_name, 'Mug')
+        self.assertFalse(Order.objects.filter(complete=True, total__isnull=True).exists())
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    def test_many_buyers_never_oversell(self):
+        stock, buyers = 5, 20
+        product = Product.objects.create(name='Last units', price=99, stock=stock)
+        orders = []
+        for i in range(buyers):
+            order = Order.objects.create(user=make_user(f'buyer{i}@example.com'))
+            OrderItem.objects.create(order=order, product=product, quantity=1); orders.append(order)
+        results = []; start = threading.Barrier(buyers)
+        def buy(order):
+            start.wait()
+            try:
+                for attempt in range(200):
+                    try: complete_order(order, f'TXN-{order.pk}'); results.append(True); return
+                    except OperationalError: time.sleep(0.005)  # SQLite lock contention: retry like a client would
+                    except OutOfStock: results.append(False); return
+            finally: connection.close()
+        threads = [threading.Thread(target=buy, args=(o,)) for o in orders]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        product.refresh_from_db()
+        sold = results.count(True)
+        self.assertEqual(len(results), buyers)
+        self.assertGreaterEqual(product.stock, 0)
+        self.assertEqual(sold, stock)
+        self.assertEqual(product.stock, stock - sold)
+        self.assertEqual(Order.objects.filter(complete=True).count(), sold)
+
+    def test_concurrent_single_line_adds_never_overhold(self):
+        stock, shoppers = 3, 12
+        product = Product.objects.create(name='Flash sale', price=99, stock=stock)
+        orders = [Order.objects.create(user=make_user(f'shopper{i}@example.com')) for i in range(shoppers)]
+        results = []; start = threading.Barrier(shoppers)
+        def add(order):
+            start.wait()
+            try:
+                for attempt in range(200):
+                    try: update_line(order, product, 'add'); results.append(True); return
+                    except OperationalError: time.sleep(0.005)
+                    except CartError: results.append(False); return
+            finally: connection.close()
+        threads = [threading.Thread(target=add, args=(o,)) for o in orders]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        self.assertEqual((len(results), results.count(True)), (shoppers, stock))
+        self.assertEqual(Reservation.objects.filter(product=product).aggregate(n=Sum('quantity'))['n'], stock)
+        self.assertEqual(available_stock([product.pk])[product.pk], 0)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, messages): raise ConnectionError('smtp down')
+
+
+class OutboxTests(TestCase):
+    def test_verify_payment_queues_email_instead_of_sending(self):
+        user = make_user(); self.client.force_login(user)
+        order = Order.objects.create(user=user)
+        OrderItem.objects.create(order=order, product=Product.objects.create(name='Mug', price=250), quantity=1)
+        self.assertEqual(self.client.post(reverse('verify_payment')).json()['status'], 'success')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxEmail.objects.get().to, user.email)
+
+    def test_drain_sends_batches_and_marks_sent(self):
+        for i in range(5): enqueue_email(f'Hello {i}', 'body', f'u{i}@example.com')
+        self.assertEqual(drain_outbox(batch_size=2), (5, 0))
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.SENT).exists())
+
+    @override_settings(EMAIL_BACKEND='store.tests.FailingEmailBackend')
+    def test_failures_back_off_then_give_up(self):
+        email = enqueue_email('Hello', 'body', 'u@example.com')
+        self.assertEqual(drain_outbox(max_attempts=2), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.PENDING, 1))
+        self.assertEqual(drain_outbox(max_attempts=2), (0, 0))  # not due yet
+        OutboxEmail.objects.update(next_attempt_at=email.created_at)
+        drain_outbox(max_attempts=2)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.FAILED, 2))
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Repeated prices and ratings make the id tiebreaker matter
+        Product.objects.bulk_create([Product(name=f'P{i}', price=100 + i % 7, rating_avg=i % 3) for i in range(50)])
+
+    def test_every_sort_walks_the_catalog_exactly_once(self):
+        for sort, ordering in SORTS.items():
+            seen, cursor = [], None
+            while True:
+                items, cursor = paginate(Product.objects.all(), sort, cursor, size=8)
+                seen += [p.id for p in items]
+                if not cursor: break
+            self.assertEqual(seen, list(Product.objects.order_by(*ordering).values_list('id', flat=True)), sort)
+
+    def test_cursor_page_renders_only_cards(self):
+        first = self.client.get(reverse('products_partial'), {'sort': 'price_low'})
+        cursor = first.context['next_cursor']
+        self.assertTrue(cursor)
+        page = self.client.get(reverse('products_partial'), {'sort': 'price_low', 'cursor': cursor})
+        self.assertTemplateNotUsed(page, 'store/product_list_partial.html')
+        self.assertEqual(len(page.context['products']), 24)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.audio = Category.objects.create(name='Audio')
+        self.headphones = Product.objects.create(name='Wireless Headphones', price=1500, category=self.audio)
+        self.speaker = Product.objects.create(name='Speaker', description='Pairs with wireless headphones', price=900, category=self.audio)
+        self.mug = Product.objects.create(name='Coffee Mug', price=200)
+
+    def search(self, **params):
+        return [r['id'] for r in self.client.get(reverse('search'), params).json()['results']]
+
+    def test_name_match_outranks_description_match(self):
+        self.assertEqual(self.search(q='wireless head'), [self.headphones.id, self.speaker.id])
+
+    def test_combines_with_filters(self):
+        self.assertEqual(self.search(q='wireless', max_price='1000'), [self.speaker.id])
+
+    def test_index_follows_product_and_category_writes(self):
+        self.mug.name = 'Travel Mug'; self.mug.save()
+        self.assertEqual(self.search(q='travel'), [self.mug.id])
+        self.audio.name = 'Hifi'; self.audio.save()
+        self.assertEqual(set(self.search(q='hifi')), {self.headphones.id, self.speaker.id})
+        self.speaker.delete()
+        self.assertEqual(self.search(q='hifi'), [self.headphones.id])
+        self.assertEqual(rebuild_index(), 2)
+
+    def test_listing_accepts_q(self):
+        response = self.client.get(reverse('products'), {'q': 'mug'})
+        self.assertEqual([p.id for p in response.context['products']], [self.mug.id])
+
+
+class FacetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.books = Category.objects.create(name='Books'); self.toys = Category.objects.create(name='Toys')
+        Product.objects.bulk_create([
+            Product(name='Novel', price=250, category=self.books, rating_avg=4.5),
+            Product(name='Atlas', price=800, category=self.books, rating_avg=3.2),
+            Product(name='Kite', price=450, category=self.toys, rating_avg=4.1),
+            Product(name='Robot', price=2000, category=self.toys, rating_avg=0),
+        ])
+
+    def facets(self, **params):
+        return compute_facets(get_filters(params))
+
+    def test_each_facet_ignores_its_own_filter(self):
+        with self.assertNumQueries(2):
+            f = self.facets(category=str(self.books.id), rating='4')
+        self.assertEqual(f['all'], 2)
+        self.assertEqual({c['name']: c['count'] for c in f['categories']}, {'Books': 1, 'Toys': 1})
+        self.assertEqual([b['count'] for b in f['price']], [1, 0, 0, 0, 0])
+        self.assertEqual([b['count'] for b in f['rating']], [1, 2])
+
+    def test_json_endpoint(self):
+        data = self.client.get(reverse('product_facets'), {'min_price': '300', 'max_price': '500'}).json()
+        self.assertEqual(data['all'], 1)
+        self.assertEqual(data['price'][1], {'value': '300-500', 'label': '₹300 - ₹500', 'count': 1})
+
+    def test_invalid_filter_values_are_dropped(self):
+        self.assertEqual(get_filters({'category': ' 7 ', 'min_price': '300', 'max_price': '499.5', 'rating': '4'}) | {'q': None, 'sort': None},
+                         {'q': None, 'category': 7, 'min_price': Decimal('300'), 'max_price': Decimal('499.5'), 'rating': Decimal('4'), 'sort': None})
+        bad = {'category': 'abc', 'min_price': 'abc', 'max_price': 'NaN', 'rating': 'abc'}
+        self.assertEqual({k: v for k, v in get_filters(bad).items() if k in bad}, dict.fromkeys(bad))
+        for params in (bad, {'category': '99999999999999999999', 'min_price': '1e30', 'rating': 'Infinity'}):
+            for url in (reverse('products'), reverse('products_partial'), reverse('product_facets')):
+                with self.subTest(url=url, params=params): self.assertEqual(self.client.get(url, params).status_code, 200)
+        page = self.client.get(reverse('products'), {'category': str(self.books.id), 'rating': '4'})
+        self.assertContains(page, f'data-value="{self.books.id}" class="filter-link ajax-filter active"')
+        self.assertContains(page, 'data-value="4" class="filter-link ajax-filter active"')
+
+
+class ListingCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Lamp', price=100)
+
+    def test_listing_is_shared_and_invalidated_by_catalog_writes(self):
+        self.client.get(reverse('products_partial'))
+        self.client.force_login(make_user())
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(reverse('products_partial')), 'Lamp')
+        version = catalog_version()
+        self.product.name = 'Desk Lamp'; self.product.save()
+        self.assertGreater(catalog_version(), version)
+        self.assertContains(self.client.get(reverse('products_partial')), 'Desk Lamp')
+
+    def test_wishlist_state_is_not_baked_into_cached_html(self):
+        user = make_user(); Wishlist.objects.create(user=user, product=self.product)
+        self.client.force_login(user)
+        response = self.client.get(reverse('products'))
+        self.assertContains(response, '<i class="far fa-heart wishlist-icon" data-wishlist-product="%d"' % self.product.id)
+        self.assertEqual(self.client.get(reverse('me_state')).json()['wishlist'], [self.product.id])
+
+    def test_stats_are_staff_only(self):
+        self.client.get(reverse('products_partial')); self.client.get(reverse('products_partial'))
+        self.client.force_login(make_user(is_staff=True))
+        self.assertEqual(self.client.get(reverse('listing_cache_stats')).json()['hits'], 1)
+
+
+class ImageDerivativeTests(ScratchMediaMixin, TestCase):
+    def upload(self, size=(1600, 1200), mode='RGBA'):
+        buffer = BytesIO(); Image.new(mode, size, (200, 30, 30, 128)).save(buffer, 'PNG')
+        return SimpleUploadedFile('photo.png', buffer.getvalue(), content_type='image/png')
+
+    def test_upload_generates_resized_webp_and_jpeg(self):
+        product = Product.objects.create(name='Lamp', price=100, image=self.upload())
+        for width in (160, 400, 900):
+            for ext in ('webp', 'jpg'):
+                path = os.path.join(settings.MEDIA_ROOT, 'derivatives', f'{os.path.splitext(product.image.name)[0]}-{width}.{ext}')
+                self.assertTrue(os.path.exists(path), path)
+                self.assertEqual(Image.open(path).width, width)
+        html = Template("{% load store_images %}{% responsive_image p 'card' 'product-image' %}").render(Context({'p': product}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('-400.webp 400w', html)
+        self.assertIn('class="product-image"', html)
+
+    def test_unreadable_upload_is_logged_and_saved(self):
+        with self.assertLogs('store.signals', 'ERROR') as logs:
+            product = Product.objects.create(name='Lamp', price=100, image=SimpleUploadedFile('broken.png', b'not an image'))
+        self.assertIn(product.image.name, logs.output[0])
+        self.assertTrue(Product.objects.filter(pk=product.pk).exists())
+
+    def test_missing_derivatives_fall_back_to_original(self):
+        product = Product(name='Lamp', price=100)
+        html = Template("{% load store_images %}{% responsive_image p 'card' %}").render(Context({'p': product}))
+        self.assertIn('<img src=""', html)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Per-view query ceilings; they must not grow with the number of products, reviews or orders."""
+    def setUp(self):
+        cache.clear()
+        self.user = make_user(); self.client.force_login(self.user)
+        category = Category.objects.create(name='Home')
+        self.products = [Product.objects.create(name=f'Item {i}', price=100 + i, category=category) for i in range(10)]
+        order = Order.objects.create(user=self.user)
+        for p in self.products:
+            OrderItem.objects.create(order=order, product=p, quantity=1)
+            Wishlist.objects.create(user=self.user, product=p)
+            Review.objects.create(user=self.user, product=p, rating=4, comment='ok')
+
+    def test_view_budgets(self):
+        budgets = [
+            (reverse('home'), 1),  # shared pages never touch the session or user
+            (reverse('products'), 3),
+            (reverse('products_partial'), 3),
+            (reverse('product_detail', args=[self.products[0].id]), 4),  # + frequently bought together
+            (reverse('cart'), 6),  # + customers also bought
+            (reverse('wishlist'), 4),
+        ]
+        for url, budget in budgets:
+            with self.subTest(url=url), self.assertQueryBudget(budget):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_server_timing_header(self):
+        with self.settings(SERVER_TIMING_HEADER=True):
+            response = self.client.get(reverse('products'))
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries, \d+ dup", tpl;dur=[\d.]+, view;dur=[\d.]+, total;dur=')
+
+
+class CartBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user(); self.client.force_login(self.user)
+        self.a, self.b, self.c = (Product.objects.create(name=n, price=p, stock=5) for n, p in (('A', 10), ('B', 20), ('C', 30)))
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, product=self.c, quantity=2)
+
+    def post(self, ops):
+        return self.client.post(reverse('update_cart_batch'), json.dumps({'operations': ops}), content_type='application/json')
+
+    def test_applies_all_operations_in_one_request(self):
+        get_cart_count(SimpleNamespace(user=self.user))  # warm the badge cache
+        with self.assertNumQueries(14):  # 12 + the hold upsert and the released hold (store.inventory)
+            response = self.post([{'productId': self.a.id, 'action': 'add', 'quantity': 2}, {'productId': self.b.id, 'action': 'set', 'quantity': 3},
+                                  {'productId': self.c.id, 'action': 'delete'}, {'productId': self.a.id, 'action': 'remove'}])
+        data = response.json()
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual([(l['productId'], l['quantity']) for l in data['lines']], [(self.a.id, 1), (self.b.id, 3)])
+        self.assertEqual((data['cartTotal'], data['cartAmount']), (4, '70.00'))
+        self.assertEqual(get_cart_count(SimpleNamespace(user=self.user))['cartItems'], 4)
+
+    def test_stock_shortfall_rejects_the_whole_batch(self):
+        response = self.post([{'productId': self.a.id, 'action': 'add'}, {'productId': self.b.id, 'action': 'set', 'quantity': 6}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('B', response.json()['message'])
+        self.assertEqual(list(OrderItem.objects.values_list('product_id', 'quantity')), [(self.c.id, 2)])
+
+    def test_rejects_malformed_operations(self):
+        for ops in ([], [{'productId': self.a.id, 'action': 'steal'}], [{'productId': 999, 'action': 'add'}]):
+            with self.subTest(ops=ops): self.assertEqual(self.post(ops).status_code, 400)
+
+
+class GuestCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.a = Product.objects.create(name='Lamp', price=10, stock=3)
+        self.b = Product.objects.create(name='Mug', price=5, stock=10)
+
+    def add(self, product, quantity=1):
+        return self.client.post(reverse('update_cart_batch'), json.dumps({'operations': [{'productId': product.id, 'action': 'add', 'quantity': quantity}]}),
+                                content_type='application/json')
+
+    def test_guest_cart_lives_in_a_signed_cookie(self):
+        self.assertEqual(self.add(self.a, 2).json()['cartTotal'], 2)
+        response = self.add(self.b)
+        self.assertEqual((response.json()['cartTotal'], response.json()['cartAmount']), (3, '25.00'))
+        self.assertFalse(Order.objects.exists())
+        self.assertIn('guest_cart', response.cookies)
+        page = self.client.get(reverse('cart'))
+        self.assertContains(page, 'Mug'); self.assertContains(page, 'Total: ₹25')
+        self.assertEqual(self.add(self.a, 2).status_code, 400)  # 4 > stock of 3
+
+    def test_tampered_cookie_is_ignored(self):
+        self.client.cookies['guest_cart'] = '{"%d": 99}' % self.a.id
+        self.assertContains(self.client.get(reverse('cart')), 'Your Cart is Empty')
+
+    def test_login_merges_guest_cart_capped_at_stock(self):
+        user = make_user()
+        OrderItem.objects.create(order=Order.objects.create(user=user), product=self.a, quantity=2)
+        self.add(self.a, 3); self.add(self.b, 4)
+        response = self.client.post(reverse('login'), {'username': user.email, 'password': 'pass12345'})
+        self.assertRedirects(response, reverse('cart'), fetch_redirect_response=False)
+        self.assertEqual(response.cookies['guest_cart'].value, '')
+        order = Order.objects.get(user=user, complete=False)
+        self.assertEqual(dict(order.orderitem_set.values_list('product__name', 'quantity')), {'Lamp': 3, 'Mug': 4})
+        self.assertEqual(get_cart_count(SimpleNamespace(user=user))['cartItems'], 7)
+
+    def test_failed_merge_keeps_the_guest_cookie(self):
+        user = make_user()
+        self.add(self.a, 2)
+        with mock.patch.object(views, 'merge_guest_cart', side_effect=OperationalError('database is locked')), self.assertLogs('store.views', 'ERROR'):
+            response = self.client.post(reverse('login'), {'username': user.email, 'password': 'pass12345'})
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        self.assertNotIn('guest_cart', response.cookies)  # untouched, still in the client
+        self.client.get(reverse('logout'))  # the view, not client.logout(), which drops every cookie
+        self.client.post(reverse('login'), {'username': user.email, 'password': 'pass12345'})
+        self.assertEqual(dict(Order.objects.get(user=user, complete=False).orderitem_set.values_list('product__name', 'quantity')), {'Lamp': 2})
+
+
+class ProductionProfileTests(TestCase):
+    def load_settings(self, **env):
+        # None unsets a variable; production needs a secret key unless a test says otherwise
+        env = {'DJANGO_SECRET_KEY': 'not-so-secret', **env}
+        with mock.patch.dict(os.environ, {k: v for k, v in env.items() if v is not None}):
+            for name in [k for k, v in env.items() if v is None]: os.environ.pop(name, None)
+            return runpy.run_path(os.path.join(settings.BASE_DIR, 'zenstore', 'settings.py'))
+
+    def test_production_profile(self):
+        prod = self.load_settings(ZENSTORE_ENV='production')
+        self.assertFalse(prod['DEBUG'])
+        self.assertEqual(prod['SQLITE_PRAGMAS']['journal_mode'], 'WAL')
+        self.assertEqual(prod['DATABASES']['default']['OPTIONS'], {'transaction_mode': 'IMMEDIATE'})
+        self.assertTrue(prod['DATABASES']['default']['CONN_HEALTH_CHECKS'])
+        self.assertEqual(prod['TEMPLATES'][0]['OPTIONS']['loaders'][0][0], 'django.template.loaders.cached.Loader')
+        pg = self.load_settings(ZENSTORE_ENV='production', POSTGRES_DB='zenstore')
+        self.assertEqual(pg['DATABASES']['default']['ENGINE'], 'django.db.backends.postgresql')
+        self.assertTrue(self.load_settings(ZENSTORE_ENV='development')['DEBUG'])
+
+    def test_production_requires_a_secret_key(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'DJANGO_SECRET_KEY'):
+            self.load_settings(ZENSTORE_ENV='production', DJANGO_SECRET_KEY=None)
+        self.assertEqual(self.load_settings(ZENSTORE_ENV='production')['SECRET_KEY'], 'not-so-secret')
+        self.assertTrue(self.load_settings(ZENSTORE_ENV='development', DJANGO_SECRET_KEY=None)['SECRET_KEY'].startswith('django-insecure'))
+
+    def test_pragmas_applied_on_connect(self):
+        with self.settings(SQLITE_PRAGMAS={'cache_size': -4321}):
+            configure_sqlite(sender=None, connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA cache_size"); self.assertEqual(cursor.fetchone()[0], -4321)
+
+
+
+STATIC_STORAGES = {'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                   'staticfiles': {'BACKEND': 'store.staticfiles.CompressedManifestStaticFilesStorage'}}
+
+class StaticAssetTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory(); self.addCleanup(root.cleanup)
+        override = override_settings(STATIC_ROOT=root.name, STORAGES=STATIC_STORAGES); override.enable(); self.addCleanup(override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0, ignore_patterns=['images', 'admin'])
+        self.url = static('css/main.css')
+        with open(os.path.join(settings.BASE_DIR, 'static', 'css', 'main.css'), 'rb') as f: self.original = f.read()
+
+    def fetch(self, url, **headers):
+        response = self.client.get(url, **headers)
+        return response, b''.join(response.streaming_content) if response.streaming else response.content
+
+    def test_bytes_transferred_before_and_after(self):
+        self.assertRegex(self.url, r'^/static/css/main\.[0-9a-f]{12}\.css$')
+        plain, before = self.fetch(self.url)
+        self.assertEqual(before, self.original)
+        self.assertNotIn('Content-Encoding', plain)
+        gz, after = self.fetch(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(gz['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(after), self.original)
+        self.assertLess(len(after), len(before) / 4)  # ~52 KB of CSS -> ~11 KB on the wire
+        for response in (plain, gz):
+            self.assertEqual(response['Cache-Control'], f'public, max-age={settings.STATIC_MAX_AGE}, immutable')
+            self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertNotIn('Content-Encoding', self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip;q=0'))
+
+    def test_brotli_preferred_when_available(self):
+        if not staticfiles.brotli: self.skipTest('brotli is not installed')
+        response, body = self.fetch(self.url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(staticfiles.brotli.decompress(body), self.original)
+
+    def test_revalidation_and_unhashed_names(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertNotEqual(self.client.get(self.url)['ETag'], response['ETag'])  # each encoding is its own representation
+        unhashed = self.client.get('/static/css/main.css')
+        self.assertEqual(unhashed['Cache-Control'], f'public, max-age={settings.STATIC_REVALIDATE_MAX_AGE}')
+        with self.assertLogs('store.metrics'):  # fall through to the app's 404
+            self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
+            self.assertEqual(self.client.get('/static/css/missing.css').status_code, 404)
+
+    def test_accepted_encodings(self):
+        self.assertEqual(accepted_encodings('gzip;q=0.5, br, identity;q=0'), {'gzip': 0.5, 'br': 1.0, 'identity': 0.0})
+        self.assertEqual(accepted_encodings(''), {})
+
+
+class IndexAuditTests(TestCase):
+    def test_one_open_order_per_user(self):
+        user = make_user(); Order.objects.create(user=user); Order.objects.create(user=user, complete=True)
+        with self.assertRaises(IntegrityError), transaction.atomic(): Order.objects.create(user=user)
+        Order.objects.create(user=user, complete=True)  # any number of completed orders
+
+    def test_audit_finds_no_scans_or_sorts_on_seeded_data(self):
+        call_command('seed_store', users=20, categories=4, products=600, reviews=1500, wishlists=100, orders=600, stdout=StringIO())
+        out = StringIO()
+        call_command('audit_indexes', analyze=True, min_rows=500, fail_on_findings=True, stdout=out)
+        self.assertIn('0 finding(s)', out.getvalue())
+
+
+class ReviewPaginationTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Lamp', price=100)
+        users = User.objects.bulk_create([User(username=f'r{i}', email=f'r{i}@example.com', first_name=f'Reviewer{i}') for i in range(25)])
+        for i, user in enumerate(users): Review.objects.create(product=self.product, user=user, rating=i % 5 + 1, comment=f'review {i}')
+        Review.objects.update(created_at=timezone.now())  # identical timestamps: the id tie-breaker must keep pages disjoint
+
+    def test_keyset_pages_cover_every_review_once(self):
+        seen, cursor = [], None
+        while True:
+            with self.assertNumQueries(1): page, cursor = review_page(self.product.id, cursor, size=10)
+            seen += [r.comment for r in page]; [r.user.first_name for r in page]  # authors come from the same query
+            if not cursor: break
+        self.assertEqual(seen, [f'review {i}' for i in range(24, -1, -1)])
+
+    def test_detail_shows_first_page_and_histogram(self):
+        response = self.client.get(reverse('product_detail', args=[self.product.id]))
+        self.assertContains(response, 'class="review-item"', count=10)
+        self.assertContains(response, 'width:20%', count=5)  # 5 of 25 reviews at each star level
+        self.assertContains(response, 'more-reviews-btn')
+
+    def test_reviews_endpoint(self):
+        first = self.client.get(reverse('product_detail', args=[self.product.id])).context['next_cursor']
+        data = self.client.get(reverse('product_reviews', args=[self.product.id]), {'cursor': first}).json()
+        self.assertEqual(data['html'].count('class="review-item"'), 10)
+        self.assertIn('review 14', data['html']); self.assertTrue(data['next_cursor'])
+        bad = self.client.get(reverse('product_reviews', args=[self.product.id]), {'cursor': 'forged'}).json()
+        self.assertIn('review 24', bad['html'])  # an invalid cursor restarts from the newest
+
+
+class SharedPageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Lamp', price=100, stock=5)
+        self.user = make_user()
+        Wishlist.objects.create(user=self.user, product=self.product)
+        OrderItem.objects.create(order=Order.objects.create(user=self.user), product=self.product, quantity=2)
+        self.pages = [reverse('home'), reverse('products'), reverse('products_partial'), reverse('product_detail', args=[self.product.id]),
+                      reverse('product_reviews', args=[self.product.id])]
+
+    def test_pages_are_identical_for_every_visitor(self):
+        anonymous = [self.client.get(url) for url in self.pages]
+        self.client.force_login(self.user)
+        for url, anon in zip(self.pages, anonymous):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.content, anon.content)
+                self.assertNotIn('Cookie', response.get('Vary', ''))
+                self.assertIn('public', response['Cache-Control'])
+                self.assertNotIn(self.user.email.encode(), response.content)
+
+    def test_me_state(self):
+        self.assertEqual(self.client.get(reverse('me_state')).json()['authenticated'], False)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('me_state'))
+        self.assertEqual(response.json()['wishlist'], [self.product.id])
+        self.assertEqual(response.json()['cartItems'], 2)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('csrftoken', response.cookies)
+
+    def test_review_post_still_requires_login(self):
+        url = reverse('product_detail', args=[self.product.id])
+        self.assertRedirects(self.client.post(url, {'rating': 5, 'comment': 'x'}), reverse('login'), fetch_redirect_response=False)
+        self.assertFalse(Review.objects.exists())
+
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Lamp', price=100, stock=5)
+        self.detail = reverse('product_detail', args=[self.product.id])
+
+    def revalidate(self, url, response, queries):
+        with self.assertNumQueries(queries):
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertIn('public', again['Cache-Control'])
+        return again
+
+    def test_listings_answer_304_without_queries(self):
+        for url in (reverse('home'), reverse('products'), reverse('products_partial')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('Last-Modified', response)
+                self.revalidate(url, response, 0)
+                self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_catalog_change_invalidates_listing_etag(self):
+        url = reverse('products')
+        etag = self.client.get(url)['ETag']
+        Product.objects.create(name='Desk', price=50, stock=1)  # bumps the catalog version via signals
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertNotEqual(self.client.get(url, HTTP_X_REQUESTED_WITH='XMLHttpRequest')['ETag'], self.client.get(url)['ETag'])
+
+    def test_detail_answers_304_with_one_lookup(self):
+        response = self.client.get(self.detail)
+        self.assertEqual(response['Last-Modified'], http_date(max(self.product.updated_at, catalog_last_modified()).timestamp()))
+        self.revalidate(self.detail, response, 1)
+
+    def test_detail_etag_follows_reviews_and_stock(self):
+        etag = self.client.get(self.detail)['ETag']
+        Review.objects.create(user=make_user(), product=self.product, rating=4, comment='ok')
+        self.assertEqual(self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.client.get(self.detail)['ETag']
+        Product.objects.filter(pk=self.product.pk).update(stock=F('stock') - 1, updated_at=Now())
+        self.assertEqual(self.client.get(self.detail, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_etag_follows_related_product_cards(self):
+        desk = Product.objects.create(name='Desk', price=50, stock=1)
+        RelatedProduct.objects.create(product=self.product, related=desk, rank=1, count=3)
+        response = self.client.get(self.detail)
+        self.assertContains(response, 'Desk')
+        desk.price = 45; desk.save()
+        again = self.client.get(self.detail, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 200)
+        self.assertContains(again, '45')
+
+    def test_release_id_changes_etags(self):
+        etag = self.client.get(self.detail)['ETag']
+        with self.settings(RELEASE_ID='next'):
+            self.assertNotEqual(self.client.get(self.detail)['ETag'], etag)
+
+    def test_missing_product_is_404(self):
+        self.assertEqual(self.client.get(reverse('product_detail', args=[self.product.id + 1])).status_code, 404)
+
+
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Lamp', price=100, stock=3)
+        self.alice, self.bob = make_user('alice@example.com'), make_user('bob@example.com')
+
+    def add(self, user, quantity):
+        if user: self.client.force_login(user)
+        else: self.client.logout()
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('update_item'), json.dumps({'productId': self.product.id, 'action': 'add', 'quantity': quantity}),
+                                    content_type='application/json')
+
+    def test_adding_holds_units_against_other_carts(self):
+        self.assertEqual(self.add(self.alice, 2).status_code, 200)
+        hold = Reservation.objects.get()
+        self.assertEqual(hold.quantity, 2)
+        self.assertGreater(hold.expires_at, timezone.now())
+        self.assertEqual(self.add(self.bob, 2).status_code, 400)
+        self.assertEqual(self.add(self.bob, 1).status_code, 200)
+        self.assertEqual(self.add(None, 1).status_code, 400)  # guests respect holds too
+        self.assertEqual(self.add(self.alice, 1).status_code, 400)
+        with self.assertNumQueries(1):
+            self.assertEqual(available_stock([self.product.id]), {self.product.id: 0})
+        self.assertEqual(available_stock([self.product.id], exclude_order=Order.objects.get(user=self.alice)), {self.product.id: 2})
+
+    def test_pages_show_available_stock(self):
+        self.add(self.bob, 1)
+        self.assertContains(self.client.get(reverse('product_detail', args=[self.product.id])), 'Only 2 left in stock.')
+        self.add(self.alice, 2)  # sold out by holds: bumps the cached listings
+        self.assertContains(self.client.get(reverse('products')), 'Out of Stock')
+        self.assertContains(self.client.get(reverse('product_detail', args=[self.product.id])), 'Currently Unavailable.')
+
+    @override_settings(CART_RESERVATION_TTL=1)
+    def test_listings_follow_hold_expiry_without_the_sweeper(self):
+        self.add(self.alice, 3)
+        self.assertContains(self.client.get(reverse('products')), 'Out of Stock')
+        time.sleep(1.1)
+        self.assertNotContains(self.client.get(reverse('products')), 'Out of Stock')
+        self.assertTrue(Reservation.objects.exists())  # not swept yet
+
+    def test_checkout_honours_other_carts_holds(self):
+        self.add(self.alice, 2)
+        late = Order.objects.create(user=self.bob); OrderItem.objects.create(order=late, product=self.product, quantity=2)  # no hold (expired)
+        with self.assertRaises(OutOfStock): complete_order(late, 'TXN-B')
+        complete_order(Order.objects.get(user=self.alice, complete=False), 'TXN-A')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_sweeper_expires_stale_holds_in_batches(self):
+        order = Order.objects.create(user=self.alice); other = Product.objects.create(name='Desk', price=50, stock=1)
+        past, future = timezone.now() - datetime.timedelta(minutes=1), timezone.now() + datetime.timedelta(minutes=5)
+        Reservation.objects.bulk_create([Reservation(order=order, product=self.product, quantity=3, expires_at=past),
+                                         Reservation(order=order, product=other, quantity=1, expires_at=past),
+                                         Reservation(order=Order.objects.create(user=self.bob), product=self.product, quantity=1, expires_at=future)])
+        self.assertEqual(available_stock([self.product.id]), {self.product.id: 2})  # expired holds never count
+        out = StringIO(); call_command('expire_reservations', batch_size=1, stdout=out)
+        self.assertIn('2 expired', out.getvalue())
+        self.assertEqual(list(Reservation.objects.values_list('quantity', flat=True)), [1])
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.mugs = Category.objects.create(name='Mugs')
+        self.mug = Product.objects.create(name='Mug', price=250, stock=50, category=self.mugs)
+        self.pen = Product.objects.create(name='Pen', price=20, stock=50)  # uncategorized
+        self.today = timezone.localdate()
+
+    def buy(self, email, **quantities):
+        order = Order.objects.create(user=make_user(email))
+        for name, qty in quantities.items(): OrderItem.objects.create(order=order, product=getattr(self, name), quantity=qty)
+        complete_order(order, f'TXN-{email}')
+        return order
+
+    def rollups(self):
+        return [sorted(model.objects.values_list(*fields, 'units', 'revenue', 'orders'), key=str)
+                for model, fields in ((DailySales, ['day']), (DailyProductSales, ['day', 'product']), (DailyCategorySales, ['day', 'category']))]
+
+    def test_checkout_adds_order_to_rollups(self):
+        self.buy('a@example.com', mug=2, pen=1); self.buy('b@example.com', pen=3)
+        self.assertEqual(Order.objects.filter(completed_at__isnull=True).count(), 0)
+        daily, products, categories = self.rollups()
+        self.assertEqual(daily, [(self.today, 6, 580, 2)])
+        self.assertEqual(products, sorted([(self.today, self.mug.pk, 2, 500, 1), (self.today, self.pen.pk, 4, 80, 2)], key=str))
+        self.assertEqual(categories, sorted([(self.today, self.mugs.pk, 2, 500, 1), (self.today, None, 4, 80, 2)], key=str))
+
+    def test_rebuild_matches_incremental_and_covers_history(self):
+        self.buy('a@example.com', mug=2, pen=1); self.buy('b@example.com', pen=3)
+        incremental = self.rollups()
+        DailySales.objects.all().delete()
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(self.rollups(), incremental)
+        # Orders from before completed_at existed file under date_ordered, priced from Product when never snapshotted
+        old = Order.objects.create(user=make_user('c@example.com'), complete=True); OrderItem.objects.create(order=old, product=self.mug, quantity=1)
+        last_year = timezone.now() - datetime.timedelta(days=365); Order.objects.filter(pk=old.pk).update(date_ordered=last_year)
+        call_command('rebuild_sales_rollups', since=(self.today - datetime.timedelta(days=1)).isoformat(), stdout=StringIO())
+        self.assertFalse(DailySales.objects.filter(day=last_year.date()).exists())
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(DailySales.objects.get(day=last_year.date()).revenue, 250)
+
+    def test_report_is_staff_only_and_reads_rollups(self):
+        url = reverse('sales_report')
+        self.client.force_login(make_user('shopper@example.com'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(make_user('staff@example.com', is_staff=True))
+        self.assertEqual(self.client.get(url, {'start': 'yesterday'}).status_code, 400)
+        self.buy('a@example.com', mug=2, pen=1)
+        with CaptureQueriesContext(connection) as few: self.client.get(url, {'format': 'json'})
+        for i in range(10): self.buy(f'more{i}@example.com', mug=1, pen=1)
+        with CaptureQueriesContext(connection) as many: report = self.client.get(url, {'format': 'json'}).json()
+        self.assertEqual(len(many), len(few))
+        self.assertEqual([q['sql'] for q in many.captured_queries if 'store_order' in q['sql']], [])
+        self.assertEqual(report['totals'], {'units': 23, 'revenue': '3220.00', 'orders': 11})
+        self.assertEqual([(row['name'], row['units']) for row in report['products']], [('Mug', 12), ('Pen', 11)])
+        self.assertEqual([row['name'] for row in report['categories']], ['Mugs', None])
+        self.assertContains(self.client.get(url), 'Uncategorized')
+
+
+class CatalogImportExportTests(ScratchMediaMixin, TestCase):
+    CSV = ('sku,name,category,price,stock,digital,description,image\n'
+           'MUG-1,Mug,Kitchen,250,10,false,Stoneware,\n'
+           'PEN-1,Pen,,20.5,,yes,,\n'
+           'BAD-1,Bad,Kitchen,cheap,1,no,,\n'
+           'NEW-1,,Kitchen,,3,,,\n')
+
+    def run_import(self, text, suffix='.csv', **options):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as f: f.write(text)
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', f.name, stdout=out, stderr=err, **options); os.unlink(f.name)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import_upserts_on_sku_and_reports_bad_rows(self):
+        existing = Product.objects.create(sku='MUG-1', name='Old mug', price=1, stock=0)
+        out, err = self.run_import(self.CSV, batch_size=2)
+        self.assertIn('4 rows: 1 created, 1 updated, 2 rejected', out)
+        self.assertIn("line 4 (BAD-1): bad price: 'cheap'", err)
+        self.assertIn('line 5 (NEW-1): new products need a name and a price', err)
+        existing.refresh_from_db()
+        self.assertEqual((existing.name, existing.price, existing.stock, existing.category.name), ('Mug', 250, 10, 'Kitchen'))
+        pen = Product.objects.get(sku='PEN-1')
+        self.assertEqual((pen.price, pen.stock, pen.digital, pen.category), (20.5, 50, True, None))  # blank stock: model default
+        self.assertEqual(Category.objects.count(), 1)
+        self.assertEqual([r['id'] for r in self.client.get(reverse('search'), {'q': 'stoneware'}).json()['results']], [existing.pk])  # bulk writes re-index
+        # JSONL partial update: only the given columns change
+        out, err = self.run_import('{"sku": "PEN-1", "stock": 7}\n\n{"sku": "PEN-1", "price": "25"}\nnot json\n', suffix='.jsonl')
+        self.assertIn('line 4: invalid JSON', err)
+        pen.refresh_from_db()
+        self.assertEqual((pen.name, pen.stock, pen.price), ('Pen', 7, 25))
+
+    def test_images_are_copied_from_the_directory_once(self):
+        images = scratch_dir(self); Image.new('RGB', (20, 20)).save(os.path.join(images, 'mug.png'))
+        rows = 'sku,name,price,image\nMUG-1,Mug,250,mug.png\nPEN-1,Pen,20,../secret.png\n'
+        out, err = self.run_import(rows, images=images)
+        self.assertIn('1 images attached', out)
+        self.assertIn("image '../secret.png' not found", err)
+        self.assertEqual(Product.objects.get(sku='MUG-1').image.name, 'mug.png')
+        self.run_import(rows, images=images)
+        self.assertEqual(os.listdir(settings.MEDIA_ROOT), ['mug.png'])  # not copied again under a new name
+
+    def test_export_round_trips_and_streams_for_staff(self):
+        kitchen = Category.objects.create(name='Kitchen')
+        Product.objects.create(sku='MUG-1', name='Mug, "large"', price=250, stock=3, category=kitchen, description='Line one\nline two')
+        Product.objects.create(sku='PEN-1', name='Pen', price=20, digital=True)
+        path = os.path.join(scratch_dir(self), 'catalog.jsonl')
+        call_command('export_catalog', path, stdout=StringIO())
+        before = list(Product.objects.order_by('pk').values())
+        with open(path) as f: self.assertEqual(json.loads(f.readline())['price'], '250.00')
+        out, err = self.run_import(open(path).read(), suffix='.jsonl')
+        self.assertIn('2 updated, 0 rejected', out)
+        self.assertEqual([{**p, 'updated_at': None} for p in Product.objects.order_by('pk').values()], [{**p, 'updated_at': None} for p in before])
+        url = reverse('catalog_export')
+        self.client.force_login(make_user('shopper@example.com'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(make_user('staff@example.com', is_staff=True))
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="catalog-', response['Content-Disposition'])
+        csv_text = b''.join(response.streaming_content).decode()
+        self.assertTrue(csv_text.startswith('sku,name,category,price,stock,digital,description,image\r\n'))
+        self.assertEqual(self.run_import(csv_text)[0].count('2 updated, 0 rejected'), 1)
+        self.assertEqual(self.client.get(url, {'format': 'xml'}).status_code, 400)
+
+    def test_products_created_without_a_sku_round_trip(self):
+        lamp = Product.objects.create(name='Lamp', price=40)
+        self.assertEqual((lamp.sku, Product.objects.get(pk=lamp.pk).sku), (f'ZS-{lamp.pk}', f'ZS-{lamp.pk}'))
+        text = ''.join(render_rows(export_rows(), 'csv'))
+        out, err = self.run_import(text)
+        self.assertIn('1 rows: 0 created, 1 updated, 0 rejected', out); self.assertEqual(err, '')
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.mug, self.tea, self.spoon, self.lamp = [Product.objects.create(name=n, price=100, stock=10) for n in ('Mug', 'Tea', 'Spoon', 'Lamp')]
+        self.user = make_user()
+
+    def order(self, *products, minutes_ago=5):
+        order = Order.objects.create(user=make_user(f'buyer{Order.objects.count()}@example.com'))
+        for p in products: OrderItem.objects.create(order=order, product=p, quantity=1)
+        complete_order(order, f'TXN-R{order.pk}')
+        Order.objects.filter(pk=order.pk).update(completed_at=timezone.now() - datetime.timedelta(minutes=minutes_ago))
+
+    def related(self, product):
+        return list(RelatedProduct.objects.filter(product=product).order_by('rank').values_list('related__name', 'count'))
+
+    def test_count_pairs(self):
+        lines = [(1, self.mug.pk), (1, self.tea.pk), (1, self.tea.pk), (2, self.mug.pk), (2, self.tea.pk), (2, self.spoon.pk), (3, self.lamp.pk)]
+        expected = {(self.mug.pk, self.tea.pk): 2, (self.tea.pk, self.mug.pk): 2, (self.mug.pk, self.spoon.pk): 1,
+                    (self.spoon.pk, self.mug.pk): 1, (self.tea.pk, self.spoon.pk): 1, (self.spoon.pk, self.tea.pk): 1}
+        with mock.patch.object(recommendations, 'sparse', None):  # pure-Python fallback
+            self.assertEqual(dict(recommendations.count_pairs(lines)), expected)
+        if not recommendations.sparse: self.skipTest('numpy/scipy are not installed')
+        pairs = recommendations.count_pairs(lines)  # sparse incidence matrix
+        self.assertEqual(pairs, expected)
+        self.assertTrue(all(type(n) is int for pair in pairs.items() for n in (*pair[0], pair[1])))  # plain ints for the upsert
+
+    def test_full_then_incremental_refresh(self):
+        self.order(self.mug, self.tea); self.order(self.mug, self.tea, self.spoon); self.order(self.lamp)
+        Order.objects.filter(completed_at__isnull=False).update(completed_at=None)  # history from before completed_at
+        out = StringIO(); call_command('refresh_recommendations', stdout=out)
+        self.assertIn('3 orders counted', out.getvalue())
+        self.assertEqual(self.related(self.mug), [('Tea', 2), ('Spoon', 1)])
+        RecommendationRefresh.objects.update(through=F('through') - datetime.timedelta(minutes=10))  # as if it ran 10 minutes ago
+        self.order(self.spoon, self.lamp); self.order(self.spoon, self.lamp); self.order(self.spoon, self.mug, minutes_ago=0)  # not settled yet
+        self.assertEqual(recommendations.refresh(top_k=1), (2, 2))  # only spoon and lamp re-ranked
+        self.assertEqual((self.related(self.spoon), self.related(self.lamp)), ([('Lamp', 2)], [('Spoon', 2)]))
+        self.assertEqual(self.related(self.mug), [('Tea', 2), ('Spoon', 1)])  # untouched, keeps its top 2
+        self.assertEqual(recommendations.refresh(), (0, 0))
+        recommendations.refresh(full=True)
+        self.assertEqual(CoPurchase.objects.get(product=self.spoon, other=self.mug).count, 1)  # the unsettled order waits for the next run
+        self.assertEqual(RecommendationRefresh.objects.filter(full=True).count(), 1)
+
+    def test_detail_and_cart_pages_show_recommendations(self):
+        self.order(self.mug, self.tea); self.order(self.mug, self.tea, self.spoon)
+        detail = reverse('product_detail', args=[self.mug.pk])
+        etag = self.client.get(detail)['ETag']
+        self.assertNotContains(self.client.get(detail), 'Frequently Bought Together')
+        recommendations.refresh()
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)  # a refresh revalidates cached detail pages
+        self.assertContains(response, 'Frequently Bought Together')
+        self.assertEqual([p.name for p in response.context['related']], ['Tea', 'Spoon'])
+        self.client.force_login(self.user)
+        self.client.post(reverse('update_item'), json.dumps({'productId': self.spoon.id, 'action': 'add'}), content_type='application/json')
+        response = self.client.get(reverse('cart'))
+        self.assertContains(response, 'Customers Also Bought')
+        self.assertEqual([p.name for p in response.context['related']], ['Mug', 'Tea'])
+
+
+class AsgiURLConf:
+    # store/urls.py as routed under zenstore/asgi.py (ASYNC_VIEWS on); earlier patterns win
+    urlpatterns = [path('update_item/', async_views.update_item), path('toggle_wishlist/', async_views.toggle_wishlist),
+                   path('initiate_payment/', async_views.initiate_payment), path('products/filter-data/', async_views.products_partial),
+                   path('', include('store.urls'))]
+
+@override_settings(ROOT_URLCONF=AsgiURLConf)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Lamp', price=100, stock=3)
+        self.user = make_user()
+
+    def post(self, url, data):
+        return self.async_client.post(url, json.dumps(data), content_type='application/json')
+
+    async def test_update_item(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.post('/update_item/', {'productId': self.product.id, 'action': 'add', 'quantity': 2})
+        self.assertEqual(response.json(), {'status': 'success', 'cartTotal': 2})
+        self.assertEqual((await self.post('/update_item/', {'productId': self.product.id, 'action': 'add', 'quantity': 2})).status_code, 400)
+        self.assertEqual((await self.post('/update_item/', {'productId': self.product.id, 'action': 'remove'})).json()['cartTotal'], 1)
+        self.assertEqual((await self.post('/update_item/', {'productId': 0, 'action': 'add'})).status_code, 404)
+        self.assertEqual(await OrderItem.objects.filter(order__user=self.user).aaggregate(n=Sum('quantity')), {'n': 1})
+        self.assertEqual((await Reservation.objects.aget(order__user=self.user)).quantity, 1)
+
+    async def test_update_item_guest_uses_cookie_cart(self):
+        response = await self.post('/update_item/', {'productId': self.product.id, 'action': 'add'})
+        self.assertEqual(response.json()['cartTotal'], 1)
+        self.assertIn('guest_cart', response.cookies)
+
+    async def test_toggle_wishlist(self):
+        self.assertEqual((await self.post('/toggle_wishlist/', {'productId': self.product.id})).status_code, 302)
+        await self.async_client.aforce_login(self.user)
+        self.assertEqual((await self.post('/toggle_wishlist/', {'productId': self.product.id})).json(), {'status': 'added'})
+        self.assertEqual((await self.post('/toggle_wishlist/', {'productId': self.product.id})).json(), {'status': 'removed'})
+        self.assertFalse(await Wishlist.objects.aexists())
+
+    async def test_initiate_payment(self):
+        self.assertEqual((await self.async_client.get('/initiate_payment/')).json(), {'status': 'ready'})
+
+    async def test_products_partial_matches_sync_view(self):
+        response = await self.async_client.get('/products/filter-data/')
+        self.assertEqual(response.content, (await sync_to_async(self.client.get)('/products/filter-data/')).content)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertEqual((await self.async_client.get('/products/filter-data/', headers={'If-None-Match': response['ETag']})).status_code, 304)
+
+    @override_settings(SERVER_TIMING_HEADER=True)
+    async def test_metrics_middleware_counts_async_queries(self):
+        await self.async_client.aforce_login(self.user)
+        with self.assertLogs('store.metrics') as logs:
+            response = await self.post('/update_item/', {'productId': self.product.id, 'action': 'add'})
+        queries = logs.records[0].metrics['queries']
+        self.assertGreater(queries, 0)
+        self.assertIn(f'{queries} queries', response['Server-Timing'])
+
+    def test_routing_follows_async_views_setting(self):
+        self.assertIs(hot(views.updateItem, async_views.update_item), views.updateItem)
+        with self.settings(ASYNC_VIEWS=True): self.assertIs(hot(views.updateItem, async_views.update_item), async_views.update_item)
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_seed_is_reproducible_and_maintains_aggregates(self):
+        call_command('seed_store', users=5, categories=3, products=20, reviews=60, wishlists=10, orders=8, stdout=StringIO())
+        self.assertEqual(Product.objects.count(), 20)
+        self.assertEqual(sum(Product.objects.values_list('rating_count', flat=True)), 60)
+        self.assertEqual(Order.objects.filter(complete=True).count(), 8)
+        first = list(Product.objects.order_by('id').values_list('name', 'price'))
+        Product.objects.all().delete(); User.objects.all().delete(); Category.objects.all().delete()
+        call_command('seed_store', users=5, categories=3, products=20, reviews=60, wishlists=10, orders=8, stdout=StringIO())
+        self.assertEqual(list(Product.objects.order_by('id').values_list('name', 'price')), first)
+
+    def test_bench_views_writes_comparable_json(self):
+        call_command('seed_store', users=3, categories=2, products=10, reviews=20, wishlists=5, orders=3, stdout=StringIO())
+        path = os.path.join(scratch_dir(self), 'bench.json')
+        call_command('bench_views', scenarios='home,cart,update_item', requests=3, concurrency=1, json_path=path, stdout=StringIO())
+        with open(path) as f: results = json.load(f)['results']
+        self.assertEqual(set(results), {'home', 'cart', 'update_item'})
+        self.assertEqual(results['update_item']['errors'], 0)
+        self.assertGreater(results['cart']['queries_per_request'], 0)
+
+    def test_async_runner(self):
+        async def request(state, i):
+            await asyncio.sleep(0)
+            response = JsonResponse({'status': 'error' if i == 1 else 'ok'}); response['Server-Timing'] = 'db;dur=1;desc="2 queries, 0 dup"'
+            return response
+        stats = run_async_scenario(request, 6, concurrency=3)
+        self.assertEqual((stats['requests'], stats['errors'], stats['queries_per_request']), (6, 3, 2))
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual((percentile(values, 50), percentile(values, 95), percentile(values, 99)), (50, 95, 99))
@@ -1,5 +1,10 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+def hot(sync_view, async_view):
+    # Native async views under ASGI (settings.ASYNC_VIEWS), the sync ones under WSGI
+    return async_view if settings.ASYNC_VIEWS else sync_view
 
 urlpatterns = [
     path('', views.home, name="home"),
@@ -7,17 +12,25 @@ urlpatterns = [
     path('login/', views.loginPage, name="login"),
     path('logout/', views.logoutUser, name="logout"),
     path('products/', views.products, name="products"),
-    path('products/filter-data/', views.products_partial, name="products_partial"),
+    path('products/filter-data/', hot(views.products_partial, async_views.products_partial), name="products_partial"),
+    path('products/facets/', views.product_facets, name="product_facets"),
+    path('search/', views.search, name="search"),
+    path('me/state/', views.me_state, name="me_state"),
+    path('monitoring/listing-cache/', views.listing_cache_stats, name="listing_cache_stats"),
+    path('monitoring/sales/', views.sales_report_view, name="sales_report"),
+    path('monitoring/catalog-export/', views.catalog_export, name="catalog_export"),
     path('product/<int:pk>/', views.product_detail, name="product_detail"),
+    path('product/<int:pk>/reviews/', views.product_reviews, name="product_reviews"),
     path('profile/', views.profile, name="profile"),
     path('wishlist/', views.wishlist_view, name="wishlist"),
-    path('toggle_wishlist/', views.toggle_wishlist, name="toggle_wishlist"),
+    path('toggle_wishlist/', hot(views.toggle_wishlist, async_views.toggle_wishlist), name="toggle_wishlist"),
     path('cart/', views.cart, name="cart"),
     path('checkout/', views.checkout, name="checkout"),
     path('payment/', views.payment, name="payment"),
-    path('update_item/', views.updateItem, name="update_item"),
+    path('update_item/', hot(views.updateItem, async_views.update_item), name="update_item"),
+    path('cart/batch/', views.update_cart_batch, name="update_cart_batch"),
     
     # NEW PAYMENT ROUTES
-    path('initiate_payment/', views.initiate_payment, name="initiate_payment"),
+    path('initiate_payment/', hot(views.initiate_payment, async_views.initiate_payment), name="initiate_payment"),
     path('verify_payment/', views.verify_payment, name="verify_payment"),
 ]
\ No newline at end of file
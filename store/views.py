@@ -1,41 +1,117 @@
-from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse
-from django.db.models import Avg
+from django.shortcuts import render, redirect
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.contrib.admin.views.decorators import staff_member_required
+from django.urls import reverse
 from django.conf import settings
-from django.core.mail import send_mail
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import ensure_csrf_cookie
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
 import json
 import datetime
+import logging
 # import razorpay  <-- Removed to prevent import errors if not installed/configured
 from .models import *
+from .cart import (get_cart_summary, parse_operations, apply_cart_operations, update_line, CartError, read_guest_cart, write_guest_cart,
+                   apply_guest_operations, guest_cart_items, guest_cart_lines, merge_guest_cart)
+from .checkout import complete_order, CheckoutError
+from .outbox import enqueue_email
+from .catalog import get_filters, catalog_page, SORT_LABELS
+from .facets import compute_facets
+from .reviews import review_page, verified_reviewers
+from .inventory import with_holds
+from .reporting import sales_report
+from .catalog_io import FORMATS, export_rows, render_rows
+from .recommendations import related_products, cart_recommendations
+from . import listing_cache
+from .conditional import listing_condition, product_condition, conditional_product
 from django.contrib.auth.decorators import login_required
 from .forms import CreateUserForm, UserLoginForm
 from django.contrib.auth import login, logout
 from django.contrib import messages
 
+logger = logging.getLogger(__name__)
+
+def shared_page(view):
+    # Same HTML for every visitor, so a shared cache or proxy may keep it: these views must not touch
+    # request.user/session (that adds Vary: Cookie). Per-user bits are hydrated from /me/state.
+    def patch(request, response):
+        if request.method in ('GET', 'HEAD') and response.status_code in (200, 304):
+            patch_cache_control(response, public=True, max_age=settings.SHARED_PAGE_MAX_AGE)
+        return response
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs): return patch(request, await view(request, *args, **kwargs))
+        return async_wrapper
+    @wraps(view)
+    def wrapper(request, *args, **kwargs): return patch(request, view(request, *args, **kwargs))
+    return wrapper
+
+@shared_page
+@listing_condition
 def home(request):
-    data = get_cart_data(request)
     categories = Category.objects.all()
-    
-    # --- DEBUG PRINT ---
-    products = Product.objects.all()[:3]
-    for p in products:
-        print(f"[DEBUG] Product: {p.name} | Image URL: {p.imageURL}")
-    # -------------------
-    
-    return render(request, 'store/home.html', {'categories': categories, 'cartItems': data['cartItems']})
+    return render(request, 'store/home.html', {'categories': categories, 'shared_page': True})
+
+@never_cache
+@ensure_csrf_cookie
+def me_state(request):
+    # Everything personal on the shared pages: header, hearts, badge, pending messages, CSRF cookie
+    user = request.user
+    state = {'authenticated': user.is_authenticated, 'email': user.email if user.is_authenticated else None,
+             'wishlist': get_wishlist_ids(request), 'cartItems': get_cart_count(request)['cartItems'],
+             'messages': [{'text': str(m), 'tags': m.tags} for m in messages.get_messages(request)]}
+    return JsonResponse(state)
 
 
 # --- HELPER ---
 def get_cart_data(request):
+    # Read-only: the open order is only created by the first cart write (updateItem)
+    order = None
     if request.user.is_authenticated:
-        customer = request.user
-        order, created = Order.objects.get_or_create(user=customer, complete=False)
+        # Prefetched so the template's get_cart_total/get_cart_items reuse the same rows;
+        # get() rather than first(): one open order per user is a unique index, and first() adds an ORDER BY
+        try: order = Order.objects.prefetch_related('orderitem_set__product').get(user=request.user, complete=False)
+        except Order.DoesNotExist: order = None
+    if order:
         items = order.orderitem_set.all()
-        cartItems = order.get_cart_items
+        cartItems = order.get_cart_items  # counted from the prefetched lines
+    elif not request.user.is_authenticated and (guest := read_guest_cart(request)):
+        # Guest cart from the signed cookie: unsaved OrderItems, so the templates render it unchanged
+        items = guest_cart_items(guest); cartItems = sum(i.quantity for i in items)
+        order = {'get_cart_total': sum(i.get_total for i in items), 'get_cart_items': cartItems}
     else:
         items = []; order = {'get_cart_total':0, 'get_cart_items':0}; cartItems = 0
     return {'items':items, 'order':order, 'cartItems':cartItems}
 
+def get_filter_context(filters):
+    return {'search_query': filters['q'], 'active_category': filters['category'], 'active_min': filters['min_price'], 'active_max': filters['max_price'],
+            'active_price': f"{filters['min_price']}-{filters['max_price']}" if filters['min_price'] or filters['max_price'] else None,
+            'active_rating': filters['rating'], 'active_sort': filters['sort'], 'sort_options': SORT_LABELS}
+
+def listing_builder(filters, cursor, template):
+    # Shared by every user: per-user bits (wishlist hearts) are applied client-side from /me/state
+    def build():
+        products, next_cursor = catalog_page(filters, cursor)
+        return render_to_string(template, {'products': products, 'next_cursor': next_cursor, 'cursor': cursor, **get_filter_context(filters)})
+    return build
+
+def get_listing_html(filters, cursor, template):
+    return listing_cache.cached(template, {**filters, 'cursor': cursor}, listing_builder(filters, cursor, template))
+
+def get_wishlist_ids(request):
+    if not request.user.is_authenticated: return []
+    return list(Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True))
+
+def get_cart_count(request):
+    # Header badge only: served from the per-user cart cache, no queries on a hit
+    cartItems = get_cart_summary(request.user)['items'] if request.user.is_authenticated else sum(read_guest_cart(request).values())
+    return {'cartItems': cartItems}
+
 # --- MOCK PAYMENT LOGIC (Simulates Server Processing) ---
 def initiate_payment(request):
     # Just returns success to open the modal
@@ -48,25 +124,17 @@ def verify_payment(request):
             customer = request.user
             order = Order.objects.get(user=customer, complete=False)
             
-            # 1. Complete Order
-            order.complete = True
+            # 1. Complete Order + 2. Decrement Stock + 3. Queue Email, all in one transaction
             # Generate a Fake Transaction ID
-            order.transaction_id = "TXN-" + str(datetime.datetime.now().timestamp()).replace('.', '')
-            order.save()
-
-            # 2. Decrement Stock
-            items = order.orderitem_set.all()
-            for item in items:
-                item.product.stock -= item.quantity
-                item.product.save()
-
-            # 3. Send Email (Still Real!)
+            transaction_id = "TXN-" + str(datetime.datetime.now().timestamp()).replace('.', '')
             try:
-                subject = f"Order Confirmed! #{order.id}"
-                message = f"Hi {customer.first_name},\n\nThank you for your order!\nTotal: ₹{order.get_cart_total}\nTransaction ID: {order.transaction_id}\n\nYour items will be shipped soon."
-                send_mail(subject, message, settings.EMAIL_HOST_USER, [customer.email], fail_silently=True)
-            except Exception as e:
-                print(f"Email Error (Check settings.py): {e}")
+                with transaction.atomic():
+                    complete_order(order, transaction_id)
+                    # Delivered by `manage.py send_outbox`, so SMTP never sits in the payment request
+                    subject = f"Order Confirmed! #{order.id}"
+                    message = f"Hi {customer.first_name},\n\nThank you for your order!\nTotal: ₹{order.get_cart_total}\nTransaction ID: {order.transaction_id}\n\nYour items will be shipped soon."
+                    enqueue_email(subject, message, customer.email)
+            except CheckoutError as e: return JsonResponse({'status': 'error', 'message': str(e)})
 
             return JsonResponse({'status': 'success'})
         except Exception as e:
@@ -76,44 +144,83 @@ def verify_payment(request):
 # --- STANDARD VIEWS (Unchanged) ---
 
 
+@shared_page
+@listing_condition
 def products(request):
-    data = get_cart_data(request)
-    products = Product.objects.annotate(avg_rating=Avg('review__rating'))
-    categories = Category.objects.all()
-    category_id = request.GET.get('category'); min_price = request.GET.get('min_price'); max_price = request.GET.get('max_price'); rating_filter = request.GET.get('rating')
-    if category_id and category_id != '': products = products.filter(category_id=category_id)
-    if min_price: products = products.filter(price__gte=min_price)
-    if max_price: products = products.filter(price__lte=max_price)
-    if rating_filter: products = products.filter(avg_rating__gte=rating_filter)
-    if request.user.is_authenticated:
-        wishlist_ids = Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True)
-        for p in products: p.is_wishlisted = p.id in wishlist_ids
-    context = {'products': products, 'categories': categories, 'active_category': category_id, 'cartItems': data['cartItems'], 'active_min': min_price, 'active_max': max_price, 'active_rating': rating_filter}
+    filters = get_filters(request.GET)
     if request.META.get('HTTP_X_REQUESTED_WITH') == 'XMLHttpRequest' or request.GET.get('ajax') == 'true':
-        return render(request, 'store/product_list_partial.html', context)
+        return HttpResponse(get_listing_html(filters, request.GET.get('cursor'), 'store/product_list_partial.html'))
+    context = get_filter_context(filters)
+    context.update({'listing_html': get_listing_html(filters, request.GET.get('cursor'), 'store/product_list_partial.html'),
+                    'facets': get_facets(filters), 'shared_page': True})
     return render(request, 'store/products.html', context)
 
+def get_facets(filters):
+    return listing_cache.cached('facets', filters, lambda: compute_facets(filters))
+
+@listing_condition
+def product_facets(request):
+    # Sidebar counts for the AJAX filter path
+    return JsonResponse(get_facets(get_filters(request.GET)))
+
+@staff_member_required
+def listing_cache_stats(request):
+    return JsonResponse(listing_cache.stats())
+
+@staff_member_required
+def sales_report_view(request):
+    # ?start=&end= (ISO dates, inclusive; default the last 30 days), ?format=json for the API
+    try:
+        end = datetime.date.fromisoformat(request.GET['end']) if request.GET.get('end') else timezone.localdate()
+        start = datetime.date.fromisoformat(request.GET['start']) if request.GET.get('start') else end - datetime.timedelta(days=29)
+    except ValueError: return JsonResponse({'status': 'error', 'message': 'Dates must be YYYY-MM-DD'}, status=400)
+    if start > end: return JsonResponse({'status': 'error', 'message': 'start is after end'}, status=400)
+    report = sales_report(start, end)
+    if request.GET.get('format') == 'json': return JsonResponse(report)
+    return render(request, 'store/sales_report.html', report)
+
+@staff_member_required
+def catalog_export(request):
+    # ?format=csv|jsonl, streamed row by row from a server-side iterator: the same file `manage.py export_catalog` writes
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS: return JsonResponse({'status': 'error', 'message': f"format must be one of: {', '.join(FORMATS)}"}, status=400)
+    response = StreamingHttpResponse(render_rows(export_rows(), fmt), content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="catalog-{timezone.localdate():%Y%m%d}.{fmt}"'
+    return response
+
+@shared_page
+@product_condition
 def product_detail(request, pk):
-    data = get_cart_data(request)
-    product = get_object_or_404(Product, id=pk)
-    reviews = Review.objects.filter(product=product).order_by('-created_at')
-    has_purchased = False; is_wishlisted = False
-    if request.user.is_authenticated:
-        has_purchased = Order.objects.filter(user=request.user, complete=True, orderitem__product=product).exists()
-        is_wishlisted = Wishlist.objects.filter(user=request.user, product=product).exists()
-    if request.method == 'POST' and request.user.is_authenticated:
-        Review.objects.create(user=request.user, product=product, rating=request.POST.get('rating'), comment=request.POST.get('comment'))
+    product = conditional_product(request, pk)
+    if product is None: raise Http404('No Product matches the given query.')
+    if request.method == 'POST':
+        if not request.user.is_authenticated: return redirect('login')
+        try: rating = min(max(int(request.POST.get('rating')), 1), 5)
+        except (TypeError, ValueError): rating = 5
+        Review.objects.create(user=request.user, product=product, rating=rating, comment=request.POST.get('comment'))
         return redirect('product_detail', pk=pk)
-    return render(request, 'store/product_detail.html', {'product': product, 'reviews': reviews, 'has_purchased': has_purchased, 'is_wishlisted': is_wishlisted, 'cartItems': data['cartItems']})
+    reviews, next_cursor = review_page(product.id)
+    return render(request, 'store/product_detail.html', {'product': product, 'reviews': reviews, 'next_cursor': next_cursor,
+                                                         'verified': verified_reviewers(product.id, reviews),
+                                                         'related': related_products(product.id), 'shared_page': True})
+
+@shared_page
+@product_condition
+def product_reviews(request, pk):
+    # "Show more reviews": the next keyset page as HTML, plus the cursor after it
+    reviews, next_cursor = review_page(pk, request.GET.get('cursor'))
+    html = render_to_string('store/review_items.html', {'reviews': reviews, 'verified': verified_reviewers(pk, reviews)})
+    return JsonResponse({'html': html, 'next_cursor': next_cursor})
 
 def cart(request):
     data = get_cart_data(request)
-    return render(request, 'store/cart.html', {'items':data['items'], 'order':data['order'], 'cartItems': data['cartItems']})
+    related = cart_recommendations([item.product_id for item in data['items'] if item.product_id])
+    return render(request, 'store/cart.html', {'items':data['items'], 'order':data['order'], 'cartItems': data['cartItems'], 'related': related})
 
 @login_required(login_url='login')
 def checkout(request):
     data = get_cart_data(request)
-    if data['order'].get_cart_items == 0: return redirect('products')
+    if data['cartItems'] == 0: return redirect('products')
     if request.method == 'POST':
         u = request.user
         u.first_name=request.POST.get('first_name'); u.last_name=request.POST.get('last_name')
@@ -125,7 +232,7 @@ def checkout(request):
 @login_required(login_url='login')
 def payment(request):
     data = get_cart_data(request)
-    if data['order'].get_cart_items == 0: return redirect('products')
+    if data['cartItems'] == 0: return redirect('products')
     if not request.user.address: messages.error(request, "Please enter shipping address"); return redirect('checkout')
     # No Razorpay keys needed here anymore
     return render(request, 'store/payment.html', {'items':data['items'], 'order':data['order'], 'cartItems': data['cartItems']})
@@ -138,22 +245,36 @@ def updateItem(request):
         try: product = Product.objects.get(id=productId)
         except: return JsonResponse({'status': 'error', 'message': 'Product not found'}, status=404)
         order, created = Order.objects.get_or_create(user=customer, complete=False)
-        orderItem, created = OrderItem.objects.get_or_create(order=order, product=product)
-        if action == 'add':
-            if (orderItem.quantity + quantity) <= product.stock: orderItem.quantity += quantity
-            else: return JsonResponse({'status': 'error', 'message': 'Not enough stock!'}, status=400)
-        elif action == 'remove': orderItem.quantity -= 1
-        orderItem.save()
-        if orderItem.quantity <= 0: orderItem.delete()
-        return JsonResponse({'status': 'success', 'cartTotal': order.get_cart_items}, safe=False)
-    return JsonResponse({'status': 'error', 'message': 'Please login'}, status=403)
+        try: update_line(order, product, action, quantity)  # also holds the units (store.inventory)
+        except CartError as e: return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+        return JsonResponse({'status': 'success', 'cartTotal': get_cart_summary(customer)['items']}, safe=False)
+    try: ops = parse_operations([{'productId': productId, 'action': action, 'quantity': quantity if action == 'add' else 1}])
+    except CartError as e: return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return update_guest_cart(request, ops)
+
+def update_guest_cart(request, ops):
+    try: cart, products = apply_guest_operations(read_guest_cart(request), ops)
+    except CartError as e: return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    lines = guest_cart_lines(cart, products)
+    return write_guest_cart(JsonResponse({'status': 'success', 'cartTotal': lines['items'], 'cartAmount': lines['total'], 'lines': lines['lines']}), cart)
+
+def update_cart_batch(request):
+    # Body: {"operations": [{"productId": 1, "action": "add|remove|set|delete", "quantity": 2}, ...]}
+    if request.method != 'POST': return JsonResponse({'status': 'error'}, status=405)
+    try: ops = parse_operations(json.loads(request.body).get('operations'))
+    except (ValueError, AttributeError): return JsonResponse({'status': 'error', 'message': 'Invalid data'}, status=400)
+    except CartError as e: return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    if not request.user.is_authenticated: return update_guest_cart(request, ops)
+    try: cart = apply_cart_operations(request.user, ops)
+    except CartError as e: return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'success', 'cartTotal': cart['items'], 'cartAmount': cart['total'], 'lines': cart['lines']})
 
 # Only kept to avoid URL errors, not used logic
 def process_order(request): return JsonResponse({'status':'error'}, safe=False)
 
 @login_required(login_url='login')
 def profile(request):
-    data = get_cart_data(request)
+    data = get_cart_count(request)
     if request.method == 'POST':
         u = request.user; u.first_name=request.POST.get('first_name'); u.last_name=request.POST.get('last_name');
         u.phone_number=request.POST.get('phone_number'); u.address=request.POST.get('address');
@@ -172,38 +293,52 @@ def toggle_wishlist(request):
 
 @login_required(login_url='login')
 def wishlist_view(request):
-    data = get_cart_data(request); wishlist_items = Wishlist.objects.filter(user=request.user)
-    products = [item.product for item in wishlist_items]
+    data = get_cart_count(request)
+    products = list(with_holds(Product.objects.filter(wishlist__user=request.user)).order_by('wishlist__id'))
     for p in products: p.is_wishlisted = True
     return render(request, 'store/wishlist.html', {'products': products, 'cartItems': data['cartItems']})
 
-def products_partial(request): 
-    products = Product.objects.annotate(avg_rating=Avg('review__rating'))
-    category_id = request.GET.get('category'); min_price = request.GET.get('min_price'); max_price = request.GET.get('max_price'); rating_filter = request.GET.get('rating')
-    if category_id and category_id != '': products = products.filter(category_id=category_id)
-    if min_price: products = products.filter(price__gte=min_price)
-    if max_price: products = products.filter(price__lte=max_price)
-    if rating_filter: products = products.filter(avg_rating__gte=rating_filter)
-    return render(request, 'store/product_list_partial.html', {'products': products})
+@shared_page
+@listing_condition
+def products_partial(request):
+    # With ?cursor= only the next page of cards is returned (infinite scroll)
+    cursor = request.GET.get('cursor')
+    template = 'store/product_cards.html' if cursor else 'store/product_list_partial.html'
+    return HttpResponse(get_listing_html(get_filters(request.GET), cursor, template))
+
+def search(request):
+    # JSON search API (autocomplete etc.); accepts the same filters and cursor as the listing
+    filters = get_filters(request.GET)
+    if not filters['q']: return JsonResponse({'status': 'error', 'message': 'Missing q'}, status=400)
+    products, next_cursor = catalog_page(filters, request.GET.get('cursor'))
+    results = [{'id': p.id, 'name': p.name, 'price': str(p.price), 'rating': p.rating_avg, 'image': p.imageURL, 'url': reverse('product_detail', args=[p.id])} for p in products]
+    return JsonResponse({'status': 'success', 'results': results, 'next_cursor': next_cursor})
 
 def registerPage(request):
     if request.user.is_authenticated: return redirect('home')
     form = CreateUserForm()
     if request.method == 'POST':
         form = CreateUserForm(request.POST)
-        if form.is_valid(): user = form.save(); login(request, user); return redirect('home')
+        if form.is_valid(): user = form.save(); login(request, user); return login_redirect(request, user)
     return render(request, 'store/register.html', {'form': form})
 
 def loginPage(request):
     if request.user.is_authenticated: return redirect('home')
     if request.method == 'POST':
         form = UserLoginForm(request, data=request.POST)
-        if form.is_valid(): login(request, form.get_user()); return redirect('home')
+        if form.is_valid(): user = form.get_user(); login(request, user); return login_redirect(request, user)
         else: messages.error(request, 'Invalid credentials')
     return render(request, 'store/login.html', {'form': UserLoginForm()})
 
-def logoutUser(request): logout(request); return redirect('login')
-
-from django.http import HttpResponse
-from django.contrib.auth import get_user_model
+def login_redirect(request, user):
+    # Guest cart (cookie) is folded into the open order, then the cookie is dropped; if the merge fails the cookie
+    # stays, so the cart survives and is merged on the next login
+    try: merged = merge_guest_cart(user, read_guest_cart(request))
+    except DatabaseError:
+        logger.exception("Guest cart merge failed for user %s", user.pk)
+        messages.error(request, "We couldn't add your guest cart to your account yet; it will be added next time you log in")
+        return redirect('home')
+    if merged: messages.success(request, f"{merged} item(s) from your guest cart were added to your cart")
+    return write_guest_cart(redirect('cart' if merged else 'home'), {})
 
+def logoutUser(request): logout(request); return redirect('login')
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'zenstore.settings')
+# Route the hot AJAX endpoints to their native async views (store/async_views.py)
+os.environ.setdefault('ZENSTORE_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
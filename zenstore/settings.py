@@ -1,22 +1,29 @@
 
 """
 Django settings for zenstore project.
-RESTORED TO LOCAL DEVELOPMENT VERSION.
+Local development by default; set ZENSTORE_ENV=production for the production profile.
 """
 
 from pathlib import Path
 import os
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# SECURITY WARNING: keep the secret key used in production secret!
-SECRET_KEY = 'django-insecure-reverted-local-key'
+ZENSTORE_ENV = os.environ.get('ZENSTORE_ENV', 'development')
+PRODUCTION = ZENSTORE_ENV == 'production'
+# Set by zenstore/asgi.py: serve update_item, toggle_wishlist, initiate_payment and products_partial from store/async_views.py
+ASYNC_VIEWS = os.environ.get('ZENSTORE_ASYNC_VIEWS') == '1'
+
+# SECURITY WARNING: keep the secret key used in production secret! The production profile refuses to start without one
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY') or ('' if PRODUCTION else 'django-insecure-reverted-local-key')
+if not SECRET_KEY: raise ImproperlyConfigured("DJANGO_SECRET_KEY must be set when ZENSTORE_ENV=production")
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = not PRODUCTION
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = [h for h in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if h]
 
 # Application definition
 
@@ -32,19 +39,21 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'store.middleware.StaticFilesMiddleware', # Assets: before sessions/auth, they need neither
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'store.middleware.RequestMetricsMiddleware', # Keep last: times the view itself
 ]
 
 ROOT_URLCONF = 'zenstore.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'store.template_backend.TimedDjangoTemplates', # DjangoTemplates + render timing
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -66,10 +75,81 @@ WSGI_APPLICATION = 'zenstore.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+    }
+}
+SQLITE_PRAGMAS = {} # applied to every new SQLite connection (store.signals.configure_sqlite)
+
+# --- PRODUCTION PROFILE ---
+if PRODUCTION:
+    # WAL lets readers run alongside the writer; NORMAL is durable across app crashes (not power loss) with WAL;
+    # busy_timeout waits for the write lock instead of failing; mmap serves reads from the page cache.
+    SQLITE_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'busy_timeout': 5000, 'mmap_size': 256 * 1024 * 1024}
+    # IMMEDIATE takes the write lock at BEGIN, so read-then-write transactions (get_or_create, checkout) queue on
+    # busy_timeout instead of failing with "database is locked" when two of them try to upgrade at once.
+    DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
+    if os.environ.get('POSTGRES_DB'):
+        DATABASES['default'] = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ['POSTGRES_DB'],
+            'USER': os.environ.get('POSTGRES_USER', ''),
+            'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+            'HOST': os.environ.get('POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        }
+    # Reuse connections across requests. Not under ASGI: each request's sync work runs on its own thread there,
+    # so a persistent connection would be orphaned with that thread
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('CONN_MAX_AGE', 0 if ASYNC_VIEWS else 60))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+    # Compile each template once per process
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ])]
+
+    # Content-hashed, precompressed assets: run `manage.py collectstatic --noinput` on every deploy
+    STORAGES = {'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'store.staticfiles.CompressedManifestStaticFilesStorage'}}
+
+# --- CACHE ---
+# Holds the per-user cart badge summary (store.cart). LocMem is per-process; point this at
+# a shared backend (Redis/Memcached) when running more than one worker.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'zenstore',
     }
 }
 
+# --- CART RESERVATIONS (store.inventory) ---
+# Seconds a cart holds the units it added (from the line's last change). Expired holds are ignored at once, and
+# cached listings a hold had sold out are refreshed when it expires; run `manage.py expire_reservations`
+# periodically (cron, or `--loop`) to delete them, keep the table small and catch any refresh the cache missed.
+CART_RESERVATION_TTL = int(os.environ.get('CART_RESERVATION_TTL', 15 * 60))
+
+# --- SHARED PAGES ---
+# Listing/detail HTML is identical for every visitor (per-user state comes from /me/state), so
+# browsers and a reverse proxy may keep it this long.
+SHARED_PAGE_MAX_AGE = 60
+# Mixed into the ETags of those pages (store/conditional.py); set per deploy so new templates never answer 304.
+RELEASE_ID = os.environ.get('ZENSTORE_RELEASE', 'dev')
+
+# --- REQUEST METRICS (store.middleware.RequestMetricsMiddleware) ---
+SERVER_TIMING_HEADER = DEBUG
+QUERY_REPEAT_WARNING = 10 # log at WARNING when one SQL statement repeats this often (N+1)
+# Per-request lines are logged at INFO; set METRICS_LOG_LEVEL=INFO to see them, otherwise only N+1 warnings print
+METRICS_LOG_LEVEL = os.environ.get('METRICS_LOG_LEVEL', 'WARNING')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {'store.metrics': {'handlers': ['console'], 'level': METRICS_LOG_LEVEL, 'propagate': False},
+                'store': {'handlers': ['console'], 'level': 'WARNING', 'propagate': False}},
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = []
 
@@ -84,6 +164,10 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static')
 ]
+# `collectstatic` writes hashed copies (+ .gz/.br) here in production; store.middleware.StaticFilesMiddleware serves them
+STATIC_ROOT = os.environ.get('STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+STATIC_MAX_AGE = 60 * 60 * 24 * 365  # hashed names change with their content
+STATIC_REVALIDATE_MAX_AGE = 60 * 60  # unhashed static files and uploads
 
 # --- MEDIA FILES (IMAGES) - LOCAL STORAGE ---
 MEDIA_URL = '/images/'